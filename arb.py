@@ -4,16 +4,189 @@ Arbitrage Scanner
 Scans matched markets for arbitrage opportunities and broadcasts to Discord
 """
 
-import json
+import math
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import datetime as dt
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import time
+import threading
 import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import columnar
+import fast_json
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
 
 # Discord webhook URL - set via environment variable or command line
 DISCORD_WEBHOOK = "YOUR_DISCORD_WEBHOOK_URL_HERE"
 
+# Kalshi snapshot columns the scanner reads (Parquet snapshots load only these)
+_KALSHI_COLUMNS = ['conditionId', 'bestBid', 'bestAsk']
+
+# Discord embed constants
+_COLOR_SAFE = 0x00FF00   # Green for safe arbitrage
+_COLOR_RISKY = 0xFF8C00  # Orange for risky arbitrage
+_TITLE_MAX = 80
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S UTC'
+
+# Discord webhooks allow 5 requests per 2 seconds
+_WEBHOOK_BURST = 5
+_WEBHOOK_RATE = 2.5  # tokens per second
+
+# Platform fees (worst case assumptions)
+_KALSHI_FEE = 0.02  # 2% on winning side
+_POLY_FEE = 0.005   # 0.5% (gas + potential fees)
+
+# Complementary positions are paid out by exactly one platform, so assume the larger fee
+_MIN_PAYOUT_COMPLEMENTARY = 1.0 - max(_KALSHI_FEE, _POLY_FEE)
+# Share of a Polymarket sale kept after fees
+_POLY_NET_FACTOR = 1.0 - _POLY_FEE
+_FEES_TEXT = f"Kalshi: {_KALSHI_FEE:.0%} | Poly: {_POLY_FEE:.1%}"
+
+# Alert embed parts that never change; shared by every message (they are only serialized)
+_ALERT_TITLE = "🚨 ARBITRAGE OPPORTUNITY 🚨"
+_FEES_FIELD = {
+    "name": "⚠️ Fees Included",
+    "value": _FEES_TEXT,
+    "inline": True
+}
+
+# (type, strategy label, action template) indexed by kernel strategy id
+_STRATEGY_META = (
+    ('poly_yes_kalshi_no', 'Complementary positions',
+     'Buy Polymarket YES @ {poly:.3f} + Buy Kalshi NO @ {kalshi:.3f}'),
+    ('poly_no_kalshi_yes', 'Complementary positions',
+     'Buy Polymarket NO @ {poly:.3f} + Buy Kalshi YES @ {kalshi:.3f}'),
+    ('same_side_yes', 'Same-side arbitrage (risky)',
+     'Buy Kalshi YES @ {kalshi:.3f}, Sell Polymarket YES @ {poly:.3f}'),
+)
+
+
+def _as_price(value) -> float:
+    """Convert a price to float, using NaN for missing or zero prices"""
+    return float(value) if value else math.nan
+
+
+def _calc_arb(k_yes_bid: float, k_yes_ask: float, k_no_ask: float,
+              p_yes_price: float, p_no_price: float) -> Tuple[int, float, float, float]:
+    """Scalar arbitrage kernel over plain floats (NaN = missing price)
+    
+    Returns (strategy, cost, min_payout, profit_pct) with the same strategy ids
+    as scan_kernel; strategy is -1 when nothing clears 0.5%.
+    """
+    none = (-1, math.nan, math.nan, math.nan)
+    
+    if math.isnan(k_yes_ask) or math.isnan(k_no_ask) or math.isnan(p_yes_price):
+        return none
+    
+    best = none
+    best_pct = -math.inf
+    
+    min_payout = _MIN_PAYOUT_COMPLEMENTARY
+    
+    # Strategy 1: Buy Polymarket YES + Buy Kalshi NO
+    cost = p_yes_price + k_no_ask
+    if cost < min_payout:
+        profit_pct = (min_payout - cost) / cost * 100
+        if profit_pct > best_pct:
+            best, best_pct = (0, cost, min_payout, profit_pct), profit_pct
+    
+    # Strategy 2: Buy Polymarket NO + Buy Kalshi YES (NaN cost never compares true)
+    cost = p_no_price + k_yes_ask
+    if cost < min_payout:
+        profit_pct = (min_payout - cost) / cost * 100
+        if profit_pct > best_pct:
+            best, best_pct = (1, cost, min_payout, profit_pct), profit_pct
+    
+    # Strategy 3: Buy Kalshi YES, Sell Polymarket YES (requires a Kalshi bid)
+    net_poly_receive = p_yes_price * _POLY_NET_FACTOR
+    if not math.isnan(k_yes_bid) and k_yes_ask < net_poly_receive:
+        profit_pct = (net_poly_receive - k_yes_ask) / k_yes_ask * 100
+        if profit_pct > best_pct:
+            best, best_pct = (2, k_yes_ask, net_poly_receive, profit_pct), profit_pct
+    
+    # Only report if >0.5% profit after fees
+    if best_pct > 0.5:
+        return best
+    return none
+
+
+def scan_kernel(k_yes_bid: np.ndarray, k_yes_ask: np.ndarray, k_no_ask: np.ndarray,
+                p_yes_price: np.ndarray, p_no_price: np.ndarray,
+                out_strategy: np.ndarray, out_profit_pct: np.ndarray,
+                out_cost: np.ndarray, out_payout: np.ndarray) -> None:
+    """Batch version of _calc_arb over aligned price columns (NaN = missing price)
+    
+    Writes the best strategy per row into the preallocated output arrays;
+    out_strategy is -1 where nothing clears 0.5%.
+    """
+    n = len(k_yes_ask)
+    cost = np.empty((n, 3), dtype=np.float64)
+    payout = np.empty((n, 3), dtype=np.float64)
+    
+    # Strategies 1 and 2: complementary positions
+    np.add(p_yes_price, k_no_ask, out=cost[:, 0])
+    np.add(p_no_price, k_yes_ask, out=cost[:, 1])
+    payout[:, :2] = _MIN_PAYOUT_COMPLEMENTARY
+    
+    # Strategy 3: Buy Kalshi YES, Sell Polymarket YES (requires a Kalshi bid)
+    cost[:, 2] = k_yes_ask
+    np.multiply(p_yes_price, _POLY_NET_FACTOR, out=payout[:, 2])
+    
+    # NaN prices compare False, which drops strategies with missing legs
+    valid = cost < payout
+    valid[:, 2] &= ~np.isnan(k_yes_bid)
+    valid &= ~(np.isnan(k_yes_ask) | np.isnan(k_no_ask) | np.isnan(p_yes_price))[:, None]
+    
+    with np.errstate(invalid='ignore'):
+        profit_pct = np.where(valid, (payout - cost) / cost * 100, -np.inf)
+    
+    # argmax keeps the first strategy on ties, matching _calc_arb
+    best = np.argmax(profit_pct, axis=1) if n else np.zeros(0, dtype=np.intp)
+    rows = np.arange(n)
+    out_profit_pct[:] = profit_pct[rows, best]
+    out_cost[:] = cost[rows, best]
+    out_payout[:] = payout[rows, best]
+    out_strategy[:] = np.where(out_profit_pct > 0.5, best, -1)  # Only report if >0.5% profit after fees
+
+
+@dataclass
+class ScanResults:
+    """Scan hits stored column-wise, one entry per opportunity
+    
+    kalshi/poly hold whatever price source the scan used; the key names
+    record how an opportunity dict labels them when iterated.
+    """
+    kalshi_key: str = 'kalshi_prices'
+    poly_key: str = 'poly_prices'
+    matches: List[Dict] = field(default_factory=list)
+    arbs: List[Dict] = field(default_factory=list)
+    kalshi: List[Dict] = field(default_factory=list)
+    poly: List[Dict] = field(default_factory=list)
+    
+    def append(self, match: Dict, arb: Dict, kalshi: Dict, poly: Dict):
+        """Record one opportunity"""
+        self.matches.append(match)
+        self.arbs.append(arb)
+        self.kalshi.append(kalshi)
+        self.poly.append(poly)
+    
+    def __len__(self) -> int:
+        return len(self.arbs)
+    
+    def __iter__(self) -> Iterator[Dict]:
+        """Yield opportunities as {'match', 'arbitrage', <kalshi_key>, <poly_key>} dicts"""
+        for match, arb, kalshi, poly in zip(self.matches, self.arbs, self.kalshi, self.poly):
+            yield {'match': match, 'arbitrage': arb, self.kalshi_key: kalshi, self.poly_key: poly}
+
 
 class ArbScanner:
     def __init__(self, webhook_url: str = DISCORD_WEBHOOK):
@@ -21,14 +194,33 @@ class ArbScanner:
         self.session = requests.Session()
         self.session.headers.update({
             'Content-Type': 'application/json',
-            'User-Agent': 'PolyArbBot/1.0'
+            'User-Agent': 'PolyArbBot/1.0',
+            'Connection': 'keep-alive'
         })
+        
+        # Keep warm connections to the webhook host for alert bursts. 429s are
+        # handled in send_discord_alert, which honours Discord's retry_after.
+        # Only failed connects are retried: a webhook POST that errors after
+        # being sent may already have posted, and retrying would duplicate it
+        # (urllib3's default allowed_methods leave POST out for read retries).
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=10, max_retries=retry)
+        self.session.mount('https://', adapter)
+        
+        # Webhook token bucket, shared by the alert sender threads
+        self._tokens = float(_WEBHOOK_BURST)
+        self._last_refill = time.monotonic()
+        self._bucket_lock = threading.Lock()
     
     def load_matches(self, matches_file: str) -> List[Dict]:
         """Load market matches from JSON file"""
         try:
-            with open(matches_file, 'r') as f:
-                data = json.load(f)
+            data = fast_json.load(matches_file)
             matches = data.get('matches', [])
             print(f"Loaded {len(matches)} market matches from {matches_file}")
             return matches
@@ -39,8 +231,7 @@ class ArbScanner:
     def load_live_prices(self, live_prices_file: str) -> Optional[Dict]:
         """Load live prices from JSON file"""
         try:
-            with open(live_prices_file, 'r') as f:
-                data = json.load(f)
+            data = fast_json.load(live_prices_file)
             print(f"Loaded live prices: {len(data.get('kalshi', {}))} Kalshi + {len(data.get('polymarket', {}))} Polymarket")
             return data
         except Exception as e:
@@ -54,12 +245,16 @@ class ArbScanner:
         # Load Kalshi markets
         kalshi_markets = {}
         try:
-            with open(kalshi_file, 'r') as f:
-                kalshi_data = json.load(f)
-            for market in kalshi_data:
-                market_id = market.get('conditionId')
-                if market_id:
-                    kalshi_markets[market_id] = market
+            # Stream the dump so only the index is kept alive for the scan
+            if columnar.is_parquet(kalshi_file):
+                records = columnar.read_records(kalshi_file, _KALSHI_COLUMNS)
+            else:
+                records = fast_json.iter_array(kalshi_file)
+            kalshi_markets = {
+                market_id: market
+                for market in records
+                if (market_id := market.get('conditionId'))
+            }
             print(f"Loaded {len(kalshi_markets)} Kalshi markets")
         except Exception as e:
             print(f"Error loading Kalshi data: {e}")
@@ -67,12 +262,11 @@ class ArbScanner:
         # Load Polymarket markets
         poly_markets = {}
         try:
-            with open(poly_file, 'r') as f:
-                poly_data = json.load(f)
-            for market in poly_data:
-                market_id = market.get('id')
-                if market_id:
-                    poly_markets[market_id] = market
+            poly_markets = {
+                market_id: market
+                for market in fast_json.iter_array(poly_file)
+                if (market_id := market.get('id'))
+            }
             print(f"Loaded {len(poly_markets)} Polymarket markets")
         except Exception as e:
             print(f"Error loading Polymarket data: {e}")
@@ -81,182 +275,175 @@ class ArbScanner:
     
     def parse_kalshi_prices(self, market: Dict) -> Optional[Dict]:
         """Extract prices from Kalshi market"""
+        # Get bid/ask prices (in probability 0-1)
+        bid = market.get('bestBid')
+        ask = market.get('bestAsk')
+        
+        # Prices must be numeric when present
+        for price in (bid, ask):
+            if price is not None and not isinstance(price, (int, float)):
+                return None
+        
+        # Convert from cents to probability if needed
+        if bid is not None and bid > 1:
+            bid = bid / 100.0
+        if ask is not None and ask > 1:
+            ask = ask / 100.0
+        
+        return {
+            'yes_bid': bid,
+            'yes_ask': ask,
+            'no_bid': (1 - ask) if ask is not None else None,
+            'no_ask': (1 - bid) if bid is not None else None,
+            'mid': (bid + ask) / 2 if (bid is not None and ask is not None) else None
+        }
+    
+    def precompute_kalshi_prices(self, kalshi_markets: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Parse every Kalshi market once, keyed by market id
+        
+        Markets whose prices cannot be parsed are left out.
+        """
+        parsed = {}
+        for market_id, market in kalshi_markets.items():
+            prices = self.parse_kalshi_prices(market)
+            if prices:
+                parsed[market_id] = prices
+        return parsed
+    
+    def _outcome_price_pair(self, market: Dict) -> Optional[Tuple[Optional[float], Optional[float]]]:
+        """Raw [Yes, No] outcome prices of a Polymarket market, or None if unparseable"""
+        # Get outcome prices (the Gamma API sends them as a JSON-encoded string)
+        outcome_prices = market.get('outcomePrices', [])
+        if isinstance(outcome_prices, str):
+            try:
+                outcome_prices = fast_json.loads(outcome_prices)
+            except ValueError:  # JSONDecodeError for both orjson and json
+                return None
+        
+        if not isinstance(outcome_prices, list) or len(outcome_prices) < 2:
+            return None
+        
+        # Assume binary market: [Yes, No] prices
         try:
-            # Get bid/ask prices (in probability 0-1)
-            bid = market.get('bestBid')
-            ask = market.get('bestAsk')
-            
-            # Convert from cents to probability if needed
-            if bid is not None and bid > 1:
-                bid = bid / 100.0
-            if ask is not None and ask > 1:
-                ask = ask / 100.0
-            
-            return {
-                'yes_bid': bid,
-                'yes_ask': ask,
-                'no_bid': (1 - ask) if ask is not None else None,
-                'no_ask': (1 - bid) if bid is not None else None,
-                'mid': (bid + ask) / 2 if (bid is not None and ask is not None) else None
-            }
-        except Exception as e:
-            print(f"Error parsing Kalshi prices: {e}")
+            yes_price = float(outcome_prices[0]) if outcome_prices[0] else None
+            no_price = float(outcome_prices[1]) if outcome_prices[1] else None
+        except (TypeError, ValueError):
             return None
+        
+        return yes_price, no_price
     
     def parse_polymarket_prices(self, market: Dict) -> Optional[Dict]:
         """Extract prices from Polymarket market"""
-        try:
-            # Get outcome prices
-            outcome_prices = market.get('outcomePrices', [])
-            if isinstance(outcome_prices, str):
-                try:
-                    outcome_prices = json.loads(outcome_prices)
-                except:
-                    outcome_prices = []
-            
-            if not outcome_prices or len(outcome_prices) < 2:
-                return None
-            
-            # Assume binary market: [Yes, No] prices
-            yes_price = float(outcome_prices[0]) if outcome_prices[0] else None
-            no_price = float(outcome_prices[1]) if len(outcome_prices) > 1 and outcome_prices[1] else None
-            
-            # Convert to 0-1 probability if needed
-            if yes_price is not None and yes_price > 1:
-                yes_price = yes_price / 100.0
-            if no_price is not None and no_price > 1:
-                no_price = no_price / 100.0
-            
-            return {
-                'yes_price': yes_price,
-                'no_price': no_price,
-                'mid': yes_price
-            }
-        except Exception as e:
-            print(f"Error parsing Polymarket prices: {e}")
+        pair = self._outcome_price_pair(market)
+        if pair is None:
             return None
+        yes_price, no_price = pair
+        
+        # Convert to 0-1 probability if needed
+        if yes_price is not None and yes_price > 1:
+            yes_price = yes_price / 100.0
+        if no_price is not None and no_price > 1:
+            no_price = no_price / 100.0
+        
+        return {
+            'yes_price': yes_price,
+            'no_price': no_price,
+            'mid': yes_price
+        }
     
-    def calculate_arbitrage(self, kalshi_prices: Dict, poly_prices: Dict, match: Dict) -> Optional[Dict]:
-        """Calculate arbitrage opportunity using complementary positions (YES + NO = 1.00)"""
-        try:
-            # Kalshi prices
-            k_yes_bid = kalshi_prices.get('yes_bid')
-            k_yes_ask = kalshi_prices.get('yes_ask')
-            k_no_bid = kalshi_prices.get('no_bid') 
-            k_no_ask = kalshi_prices.get('no_ask')
-            
-            # Polymarket prices
-            p_yes_price = poly_prices.get('yes_price')
-            p_no_price = poly_prices.get('no_price')
-            
-            if not all([k_yes_ask, k_no_ask, p_yes_price]):
-                return None
-            
-            # Platform fees (worst case assumptions)
-            kalshi_fee = 0.02  # 2% on winning side
-            poly_fee = 0.005   # 0.5% (gas + potential fees)
-            
-            opportunities = []
-            
-            # Strategy 1: Buy Polymarket YES + Buy Kalshi NO
-            # This works when: poly_yes_price + kalshi_no_ask < 1.00 (after fees)
-            if p_yes_price and k_no_ask:
-                cost = p_yes_price + k_no_ask
-                
-                # Calculate expected payout after fees
-                # If YES wins: Poly pays $1 - poly_fee, Kalshi NO loses
-                # If NO wins: Kalshi pays $1 - kalshi_fee, Poly YES loses
-                expected_payout_yes = (1 - poly_fee) + 0  # Poly wins, Kalshi loses
-                expected_payout_no = 0 + (1 - kalshi_fee)   # Kalshi wins, Poly loses
-                
-                # Use worst case (minimum payout)
-                min_payout = min(expected_payout_yes, expected_payout_no)
-                
-                if cost < min_payout:
-                    profit = min_payout - cost
-                    profit_pct = (profit / cost) * 100
-                    
-                    opportunities.append({
-                        'type': 'poly_yes_kalshi_no',
-                        'action': f'Buy Polymarket YES @ {p_yes_price:.3f} + Buy Kalshi NO @ {k_no_ask:.3f}',
-                        'cost': cost,
-                        'min_payout': min_payout,
-                        'profit': profit,
-                        'profit_pct': profit_pct,
-                        'poly_price': p_yes_price,
-                        'kalshi_price': k_no_ask,
-                        'strategy': 'Complementary positions'
-                    })
-            
-            # Strategy 2: Buy Polymarket NO + Buy Kalshi YES  
-            if p_no_price and k_yes_ask:
-                cost = p_no_price + k_yes_ask
-                
-                # Calculate expected payout after fees
-                expected_payout_yes = 0 + (1 - kalshi_fee)   # Kalshi wins, Poly loses
-                expected_payout_no = (1 - poly_fee) + 0      # Poly wins, Kalshi loses
-                
-                min_payout = min(expected_payout_yes, expected_payout_no)
-                
-                if cost < min_payout:
-                    profit = min_payout - cost
-                    profit_pct = (profit / cost) * 100
-                    
-                    opportunities.append({
-                        'type': 'poly_no_kalshi_yes',
-                        'action': f'Buy Polymarket NO @ {p_no_price:.3f} + Buy Kalshi YES @ {k_yes_ask:.3f}',
-                        'cost': cost,
-                        'min_payout': min_payout,
-                        'profit': profit,
-                        'profit_pct': profit_pct,
-                        'poly_price': p_no_price,
-                        'kalshi_price': k_yes_ask,
-                        'strategy': 'Complementary positions'
-                    })
-            
-            # Strategy 3: Traditional same-side arbitrage (higher risk)
-            # Buy low, sell high on same outcome
-            if k_yes_ask and k_yes_bid and p_yes_price:
-                # Buy Kalshi YES, Sell Polymarket YES
-                if k_yes_ask < p_yes_price * (1 - poly_fee):
-                    net_poly_receive = p_yes_price * (1 - poly_fee)
-                    kalshi_cost = k_yes_ask
-                    if net_poly_receive > kalshi_cost:
-                        profit = net_poly_receive - kalshi_cost
-                        profit_pct = (profit / kalshi_cost) * 100
-                        
-                        opportunities.append({
-                            'type': 'same_side_yes',
-                            'action': f'Buy Kalshi YES @ {k_yes_ask:.3f}, Sell Polymarket YES @ {p_yes_price:.3f}',
-                            'cost': kalshi_cost,
-                            'min_payout': net_poly_receive,
-                            'profit': profit,
-                            'profit_pct': profit_pct,
-                            'poly_price': p_yes_price,
-                            'kalshi_price': k_yes_ask,
-                            'strategy': 'Same-side arbitrage (risky)'
-                        })
-            
-            # Return best opportunity
-            if opportunities:
-                best_opp = max(opportunities, key=lambda x: x['profit_pct'])
-                if best_opp['profit_pct'] > 0.5:  # Only report if >0.5% profit after fees
-                    return best_opp
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error calculating arbitrage: {e}")
+    def precompute_polymarket_price_arrays(self, poly_markets: Dict[str, Dict]) -> Tuple[Dict[str, int], np.ndarray, np.ndarray]:
+        """Parse Polymarket outcome prices into aligned yes/no arrays
+        
+        Returns (index, yes, no) where index maps market id to its row.
+        Markets whose prices cannot be parsed are left out; missing or zero
+        prices are NaN, as in the scan's other price columns.
+        """
+        index = {}
+        pairs = []
+        for market_id, market in poly_markets.items():
+            pair = self._outcome_price_pair(market)
+            if pair is not None:
+                index[market_id] = len(pairs)
+                pairs.append(pair)
+        
+        prices = np.array(pairs, dtype=np.float64).reshape(-1, 2)  # None -> NaN
+        prices = np.where(prices > 1, prices / 100.0, prices)  # Convert to 0-1 probability if needed
+        prices[prices == 0] = np.nan
+        
+        return index, prices[:, 0], prices[:, 1]
+    
+    def calculate_arbitrage(self, k_yes_bid: Optional[float], k_yes_ask: Optional[float],
+                            k_no_bid: Optional[float], k_no_ask: Optional[float],
+                            p_yes_price: Optional[float], p_no_price: Optional[float],
+                            match: Dict) -> Optional[Dict]:
+        """Calculate arbitrage opportunity using complementary positions (YES + NO = 1.00)
+        
+        Prices are passed as scalars (None when missing) so callers don't
+        have to pack them into dicts first.
+        """
+        strategy, cost, min_payout, profit_pct = _calc_arb(
+            _as_price(k_yes_bid), _as_price(k_yes_ask), _as_price(k_no_ask),
+            _as_price(p_yes_price), _as_price(p_no_price)
+        )
+        
+        if strategy < 0:
             return None
+        
+        return self._build_opportunity(
+            strategy, cost, min_payout, profit_pct,
+            k_yes_ask, k_no_ask, p_yes_price, p_no_price
+        )
+    
+    def _price_vector(self, values: Iterable, count: int = -1) -> np.ndarray:
+        """Build a float64 price column, using NaN for missing or zero prices"""
+        return np.fromiter((v if v else np.nan for v in values), dtype=np.float64, count=count)
     
-    def format_discord_message(self, arb: Dict, match: Dict) -> Dict:
-        """Format arbitrage opportunity as Discord embed"""
+    def _best_strategies(self, k_yes_bid: np.ndarray, k_yes_ask: np.ndarray, k_no_ask: np.ndarray,
+                         p_yes_price: np.ndarray, p_no_price: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Run scan_kernel over aligned price columns
+        
+        Returns (strategy, cost, min_payout, profit_pct) arrays, one entry per row.
+        """
+        n = len(k_yes_ask)
+        strategy = np.empty(n, dtype=np.int64)
+        profit_pct = np.empty(n, dtype=np.float64)
+        cost = np.empty(n, dtype=np.float64)
+        min_payout = np.empty(n, dtype=np.float64)
+        
+        scan_kernel(k_yes_bid, k_yes_ask, k_no_ask, p_yes_price, p_no_price,
+                    strategy, profit_pct, cost, min_payout)
+        
+        return strategy, cost, min_payout, profit_pct
+    
+    def _build_opportunity(self, strategy: int, cost: float, min_payout: float, profit_pct: float,
+                           k_yes_ask: float, k_no_ask: float, p_yes_price: float, p_no_price: float) -> Dict:
+        """Materialize the opportunity dict for the winning strategy id"""
+        opp_type, label, action = _STRATEGY_META[strategy]
+        poly_price = (p_yes_price, p_no_price, p_yes_price)[strategy]
+        kalshi_price = (k_no_ask, k_yes_ask, k_yes_ask)[strategy]
+        cost = float(cost)
+        min_payout = float(min_payout)
+        
+        return {
+            'type': opp_type,
+            'action': action.format(poly=poly_price, kalshi=kalshi_price),
+            'cost': cost,
+            'min_payout': min_payout,
+            'profit': min_payout - cost,
+            'profit_pct': float(profit_pct),
+            'poly_price': poly_price,
+            'kalshi_price': kalshi_price,
+            'strategy': label
+        }
+    
+    def format_discord_message(self, arb: Dict, match: Dict, timestamp: Optional[str] = None) -> Dict:
+        """Format arbitrage opportunity as Discord embed
+        
+        timestamp lets a scan stamp all of its alerts with the same footer time.
+        """
         
         # Color based on strategy type
-        if arb.get('strategy') == 'Complementary positions':
-            color = 0x00FF00  # Green for safe arbitrage
-        else:
-            color = 0xFF8C00  # Orange for risky arbitrage
+        color = _COLOR_SAFE if arb.get('strategy') == 'Complementary positions' else _COLOR_RISKY
         
         # Format cost and payout
         cost = arb.get('cost', 0)
@@ -264,12 +451,12 @@ class ArbScanner:
         profit = arb.get('profit', 0)
         
         embed = {
-            "title": "🚨 ARBITRAGE OPPORTUNITY 🚨",
+            "title": _ALERT_TITLE,
             "color": color,
             "fields": [
                 {
                     "name": "📊 Market",
-                    "value": f"**Kalshi:** {match['kalshi_title'][:80]}...\n**Polymarket:** {match['poly_title'][:80]}...",
+                    "value": f"**Kalshi:** {match['kalshi_title'][:_TITLE_MAX]}...\n**Polymarket:** {match['poly_title'][:_TITLE_MAX]}...",
                     "inline": False
                 },
                 {
@@ -302,14 +489,10 @@ class ArbScanner:
                     "value": f"{match.get('score', 0):.1f}",
                     "inline": True
                 },
-                {
-                    "name": "⚠️ Fees Included",
-                    "value": "Kalshi: 2% | Poly: 0.5%",
-                    "inline": True
-                }
+                _FEES_FIELD
             ],
             "footer": {
-                "text": f"PolyArbBot • {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}"
+                "text": f"PolyArbBot • {timestamp or dt.datetime.now().strftime(_TIMESTAMP_FORMAT)}"
             }
         }
         
@@ -320,117 +503,174 @@ class ArbScanner:
     def send_discord_alert(self, message: Dict) -> bool:
         """Send alert to Discord webhook"""
         try:
-            response = self.session.post(self.webhook_url, json=message, timeout=10)
+            # Session headers already carry Content-Type: application/json
+            body = fast_json.dumps(message)
+            self._acquire_token()
+            response = self.session.post(self.webhook_url, data=body, timeout=10)
+            if response.status_code == 429:
+                # Rate limited - wait as long as Discord asks, then retry once
+                time.sleep(self._retry_after(response))
+                response = self.session.post(self.webhook_url, data=body, timeout=10)
+            self._sync_rate_limit(response)
+            
             if response.status_code == 204:
-                print("✅ Discord alert sent successfully")
+                logger.info("✅ Discord alert sent successfully")
                 return True
             else:
-                print(f"❌ Discord alert failed: {response.status_code} - {response.text}")
+                logger.warning(f"❌ Discord alert failed: {response.status_code} - {response.text}")
                 return False
         except Exception as e:
-            print(f"❌ Error sending Discord alert: {e}")
+            logger.error(f"❌ Error sending Discord alert: {e}")
             return False
     
+    def _acquire_token(self):
+        """Take a webhook token, sleeping only when the bucket is empty"""
+        with self._bucket_lock:
+            now = time.monotonic()
+            self._tokens = min(_WEBHOOK_BURST, self._tokens + (now - self._last_refill) * _WEBHOOK_RATE)
+            self._last_refill = now
+            # Going negative reserves a future token, so concurrent senders queue up in order
+            self._tokens -= 1
+            wait = -self._tokens / _WEBHOOK_RATE if self._tokens < 0 else 0.0
+        
+        if wait:
+            time.sleep(wait)
+    
+    def _sync_rate_limit(self, response: requests.Response):
+        """Empty the bucket when Discord reports no requests left in the window"""
+        if response.headers.get('X-RateLimit-Remaining') != '0':
+            return
+        try:
+            reset_after = float(response.headers.get('X-RateLimit-Reset-After', 0))
+        except ValueError:
+            reset_after = 0.0
+        
+        with self._bucket_lock:
+            # Next token becomes available once the window resets
+            self._tokens = min(self._tokens, 1 - reset_after * _WEBHOOK_RATE)
+    
+    def _retry_after(self, response: requests.Response) -> float:
+        """Seconds to wait before retrying a rate-limited webhook call"""
+        try:
+            return float(response.headers.get('Retry-After') or response.json().get('retry_after', 1.0))
+        except (ValueError, AttributeError):
+            return 1.0
+    
+    def send_discord_alerts(self, messages: List[Dict], max_workers: int = 5) -> int:
+        """Send alerts concurrently and return how many were delivered"""
+        if not messages:
+            return 0
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(messages))) as executor:
+            return sum(executor.map(self.send_discord_alert, messages))
+    
     def scan_for_arbitrage_with_live_prices(self, matches: List[Dict], live_prices: Dict,
-                          min_profit_pct: float = 0.5, max_profit_pct: float = 25.0, max_alerts: int = 10) -> List[Dict]:
+                          min_profit_pct: float = 0.5, max_profit_pct: float = 25.0, max_alerts: int = 10) -> ScanResults:
         """Scan for arbitrage using live prices"""
         
-        print(f"Scanning {len(matches)} matched markets for arbitrage opportunities...")
-        print(f"Profit threshold: {min_profit_pct}% - {max_profit_pct}% (filtering out unrealistic opportunities)")
+        logger.info(f"Scanning {len(matches)} matched markets for arbitrage opportunities...")
+        logger.info(f"Profit threshold: {min_profit_pct}% - {max_profit_pct}% (filtering out unrealistic opportunities)")
+        
+        # One footer timestamp for every alert of this scan
+        scan_time = dt.datetime.now().strftime(_TIMESTAMP_FORMAT)
         
         kalshi_prices = live_prices.get('kalshi', {})
         poly_prices = live_prices.get('polymarket', {})
         
-        opportunities = []
+        # Keep only matches with live prices on both sides, paired with those prices
+        kalshi_get = kalshi_prices.get
+        poly_get = poly_prices.get
+        rows = [
+            (match, kalshi_live, poly_live)
+            for match in matches
+            if (kalshi_live := kalshi_get(match.get('kalshi_id'))) and (poly_live := poly_get(match.get('poly_id')))
+        ]
+        n = len(rows)
+        
+        # Price columns (structure-of-arrays) for the vectorized strategy evaluation
+        k_yes_bid = self._price_vector((k.get('yes_bid') for _, k, _ in rows), n)
+        k_yes_ask = self._price_vector((k.get('yes_ask') for _, k, _ in rows), n)
+        k_no_ask = self._price_vector((k.get('no_ask') for _, k, _ in rows), n)
+        p_yes_price = self._price_vector((p.get('yes_price') for _, _, p in rows), n)
+        p_no_price = self._price_vector((p.get('no_price') for _, _, p in rows), n)
+        
+        strategy, cost, min_payout, profit_pct = self._best_strategies(
+            k_yes_bid, k_yes_ask, k_no_ask, p_yes_price, p_no_price
+        )
+        
+        opportunities = ScanResults()
+        alerts = []
         alerts_sent = 0
         
-        for i, match in enumerate(matches):
+        # Only the rows with a reportable strategy need Python-level handling
+        for i in np.flatnonzero(strategy >= 0):
             if alerts_sent >= max_alerts:
-                print(f"Reached maximum alert limit ({max_alerts})")
+                logger.info(f"Reached maximum alert limit ({max_alerts})")
                 break
-                
-            if i % 20 == 0:
-                print(f"  Processed {i}/{len(matches)} matches...")
             
-            # Get live prices
-            kalshi_id = match.get('kalshi_id')
-            poly_id = match.get('poly_id')
-            
-            if not kalshi_id or not poly_id:
-                continue
-            
-            kalshi_live = kalshi_prices.get(kalshi_id)
-            poly_live = poly_prices.get(poly_id)
+            match, kalshi_live, poly_live = rows[i]
             
-            if not kalshi_live or not poly_live:
-                continue
-            
-            # Convert to expected format
-            kalshi_price_data = {
-                'yes_bid': kalshi_live.get('yes_bid'),
-                'yes_ask': kalshi_live.get('yes_ask'),
-                'no_bid': kalshi_live.get('no_bid'),
-                'no_ask': kalshi_live.get('no_ask')
-            }
-            
-            poly_price_data = {
-                'yes_price': poly_live.get('yes_price'),
-                'no_price': poly_live.get('no_price')
-            }
-            
-            # Calculate arbitrage
-            arb = self.calculate_arbitrage(kalshi_price_data, poly_price_data, match)
-            
-            if arb and min_profit_pct <= arb['profit_pct'] <= max_profit_pct:
-                print(f"\n🚨 ARBITRAGE FOUND:")
-                print(f"   Market: {match['kalshi_title'][:60]}...")
-                print(f"   Strategy: {arb.get('strategy', 'Unknown')}")
-                print(f"   Action: {arb['action']}")
-                print(f"   Cost: ${arb.get('cost', 0):.3f}")
-                print(f"   Min Payout: ${arb.get('min_payout', 0):.3f}")
-                print(f"   Profit: ${arb.get('profit', 0):.3f} ({arb['profit_pct']:.2f}%)")
+            if min_profit_pct <= profit_pct[i] <= max_profit_pct:
+                arb = self._build_opportunity(
+                    strategy[i], cost[i], min_payout[i], profit_pct[i],
+                    kalshi_live.get('yes_ask'), kalshi_live.get('no_ask'),
+                    poly_live.get('yes_price'), poly_live.get('no_price')
+                )
                 
-                opportunities.append({
-                    'match': match,
-                    'arbitrage': arb,
-                    'kalshi_prices': kalshi_live,
-                    'poly_prices': poly_live
-                })
+                # Only build the report when someone is listening
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(
+                        f"🚨 ARBITRAGE FOUND:\n"
+                        f"   Market: {match['kalshi_title'][:60]}...\n"
+                        f"   Strategy: {arb.get('strategy', 'Unknown')}\n"
+                        f"   Action: {arb['action']}\n"
+                        f"   Cost: ${arb.get('cost', 0):.3f}\n"
+                        f"   Min Payout: ${arb.get('min_payout', 0):.3f}\n"
+                        f"   Profit: ${arb.get('profit', 0):.3f} ({arb['profit_pct']:.2f}%)"
+                    )
                 
-                # Send Discord alert
-                discord_msg = self.format_discord_message(arb, match)
-                if self.send_discord_alert(discord_msg):
-                    alerts_sent += 1
-                    time.sleep(1)  # Rate limit protection
-            
-            elif arb and arb['profit_pct'] > max_profit_pct:
-                print(f"   ⚠️ Filtered out unrealistic opportunity: {arb['profit_pct']:.1f}% profit (likely data issue)")
+                opportunities.append(match, arb, kalshi_live, poly_live)
+                
+                # Queue Discord alert; once the queue fills the remaining slots it is sent
+                # concurrently, and failed posts leave their slots to later opportunities
+                alerts.append(self.format_discord_message(arb, match, scan_time))
+                if len(alerts) >= max_alerts - alerts_sent:
+                    alerts_sent += self.send_discord_alerts(alerts)
+                    alerts = []
+            
+            elif profit_pct[i] > max_profit_pct:
+                logger.info("   ⚠️ Filtered out unrealistic opportunity: %.1f%% profit (likely data issue)", profit_pct[i])
+        
+        # Deliver the alerts still queued
+        alerts_sent += self.send_discord_alerts(alerts)
         
-        print(f"\nScan complete!")
-        print(f"Found {len(opportunities)} arbitrage opportunities")
-        print(f"Sent {alerts_sent} Discord alerts")
+        logger.info(f"Scan complete! Found {len(opportunities)} arbitrage opportunities, sent {alerts_sent} Discord alerts")
         
         return opportunities
     
     def scan_for_arbitrage(self, matches: List[Dict], kalshi_markets: Dict, poly_markets: Dict, 
-                          min_profit_pct: float = 2.0, max_profit_pct: float = 50.0, max_alerts: int = 10) -> List[Dict]:
+                          min_profit_pct: float = 2.0, max_profit_pct: float = 50.0, max_alerts: int = 10) -> ScanResults:
         """Scan matched markets for arbitrage opportunities"""
         
-        print(f"Scanning {len(matches)} matched markets for arbitrage opportunities...")
-        print(f"Profit threshold: {min_profit_pct}% - {max_profit_pct}% (filtering out unrealistic opportunities)")
+        logger.info(f"Scanning {len(matches)} matched markets for arbitrage opportunities...")
+        logger.info(f"Profit threshold: {min_profit_pct}% - {max_profit_pct}% (filtering out unrealistic opportunities)")
         
-        opportunities = []
-        alerts_sent = 0
+        # One footer timestamp for every alert of this scan
+        scan_time = dt.datetime.now().strftime(_TIMESTAMP_FORMAT)
         
-        for i, match in enumerate(matches):
-            if alerts_sent >= max_alerts:
-                print(f"Reached maximum alert limit ({max_alerts})")
-                break
-                
-            if i % 20 == 0:
-                print(f"  Processed {i}/{len(matches)} matches...")
-            
-            # Get market data
+        # Parse each matched market once; a market often appears in several matches
+        kalshi_ids = {match.get('kalshi_id') for match in matches}
+        kalshi_parsed = self.precompute_kalshi_prices(
+            {kalshi_id: kalshi_markets[kalshi_id] for kalshi_id in kalshi_ids if kalshi_id in kalshi_markets}
+        )
+        poly_ids = {match.get('poly_id') for match in matches}
+        poly_index, poly_yes, poly_no = self.precompute_polymarket_price_arrays(
+            {poly_id: poly_markets[poly_id] for poly_id in poly_ids if poly_id in poly_markets}
+        )
+        
+        # Pair each match with its parsed market prices
+        rows = []
+        for match in matches:
             kalshi_id = match.get('kalshi_id')
             poly_id = match.get('poly_id')
             
@@ -443,64 +683,99 @@ class ArbScanner:
             if not kalshi_market or not poly_market:
                 continue
             
-            # Parse prices
-            kalshi_prices = self.parse_kalshi_prices(kalshi_market)
-            poly_prices = self.parse_polymarket_prices(poly_market)
+            kalshi_prices = kalshi_parsed.get(kalshi_id)
+            poly_row = poly_index.get(poly_id)
             
-            if not kalshi_prices or not poly_prices:
+            if not kalshi_prices or poly_row is None:
                 continue
             
-            # Calculate arbitrage
-            arb = self.calculate_arbitrage(kalshi_prices, poly_prices, match)
+            rows.append((match, kalshi_market, poly_market, kalshi_prices, poly_row))
+        
+        # Price columns (structure-of-arrays) for the vectorized strategy evaluation
+        k_yes_bid = self._price_vector(r[3].get('yes_bid') for r in rows)
+        k_yes_ask = self._price_vector(r[3].get('yes_ask') for r in rows)
+        k_no_ask = self._price_vector(r[3].get('no_ask') for r in rows)
+        poly_rows = np.fromiter((r[4] for r in rows), dtype=np.intp, count=len(rows))
+        p_yes_price = poly_yes[poly_rows]
+        p_no_price = poly_no[poly_rows]
+        
+        strategy, cost, min_payout, profit_pct = self._best_strategies(
+            k_yes_bid, k_yes_ask, k_no_ask, p_yes_price, p_no_price
+        )
+        
+        opportunities = ScanResults(kalshi_key='kalshi_market', poly_key='poly_market')
+        alerts = []
+        alerts_sent = 0
+        
+        # Only the rows with a reportable strategy need Python-level handling
+        for i in np.flatnonzero(strategy >= 0):
+            if alerts_sent >= max_alerts:
+                logger.info(f"Reached maximum alert limit ({max_alerts})")
+                break
+            
+            match, kalshi_market, poly_market, kalshi_prices, _ = rows[i]
             
-            if arb and min_profit_pct <= arb['profit_pct'] <= max_profit_pct:
-                print(f"\n🚨 ARBITRAGE FOUND:")
-                print(f"   Market: {match['kalshi_title'][:60]}...")
-                print(f"   Action: {arb['action']}")
-                print(f"   Profit: {arb['profit_pct']:.2f}%")
+            if min_profit_pct <= profit_pct[i] <= max_profit_pct:
+                arb = self._build_opportunity(
+                    strategy[i], cost[i], min_payout[i], profit_pct[i],
+                    kalshi_prices.get('yes_ask'), kalshi_prices.get('no_ask'),
+                    float(p_yes_price[i]), float(p_no_price[i])
+                )
                 
-                opportunities.append({
-                    'match': match,
-                    'arbitrage': arb,
-                    'kalshi_market': kalshi_market,
-                    'poly_market': poly_market
-                })
+                # Only build the report when someone is listening
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(
+                        f"🚨 ARBITRAGE FOUND:\n"
+                        f"   Market: {match['kalshi_title'][:60]}...\n"
+                        f"   Action: {arb['action']}\n"
+                        f"   Profit: {arb['profit_pct']:.2f}%"
+                    )
                 
-                # Send Discord alert
-                discord_msg = self.format_discord_message(arb, match)
-                if self.send_discord_alert(discord_msg):
-                    alerts_sent += 1
-                    time.sleep(1)  # Rate limit protection
-            
-            elif arb and arb['profit_pct'] > max_profit_pct:
-                print(f"   ⚠️ Filtered out unrealistic opportunity: {arb['profit_pct']:.1f}% profit (likely data issue)")
+                opportunities.append(match, arb, kalshi_market, poly_market)
+                
+                # Queue Discord alert; once the queue fills the remaining slots it is sent
+                # concurrently, and failed posts leave their slots to later opportunities
+                alerts.append(self.format_discord_message(arb, match, scan_time))
+                if len(alerts) >= max_alerts - alerts_sent:
+                    alerts_sent += self.send_discord_alerts(alerts)
+                    alerts = []
+            
+            elif profit_pct[i] > max_profit_pct:
+                logger.info("   ⚠️ Filtered out unrealistic opportunity: %.1f%% profit (likely data issue)", profit_pct[i])
+        
+        # Deliver the alerts still queued
+        alerts_sent += self.send_discord_alerts(alerts)
         
-        print(f"\nScan complete!")
-        print(f"Found {len(opportunities)} arbitrage opportunities")
-        print(f"Sent {alerts_sent} Discord alerts")
+        logger.info(f"Scan complete! Found {len(opportunities)} arbitrage opportunities, sent {alerts_sent} Discord alerts")
         
         return opportunities
     
-    def save_opportunities(self, opportunities: List[Dict], output_file: str):
+    def save_opportunities(self, opportunities: ScanResults, output_file: str):
         """Save arbitrage opportunities to JSON file"""
         output_data = {
             'generated_at': dt.datetime.now(dt.timezone.utc).isoformat(),
             'total_opportunities': len(opportunities),
-            'opportunities': []
+            # Built straight from the match/arb columns in a single pass
+            'opportunities': [
+                {
+                    'match': match,
+                    'arbitrage': arb,
+                    'kalshi_title': match['kalshi_title'],
+                    'poly_title': match['poly_title'],
+                    'profit_pct': arb['profit_pct'],
+                    'action': arb['action']
+                }
+                for match, arb in zip(opportunities.matches, opportunities.arbs)
+            ]
         }
         
-        for opp in opportunities:
-            output_data['opportunities'].append({
-                'match': opp['match'],
-                'arbitrage': opp['arbitrage'],
-                'kalshi_title': opp['match']['kalshi_title'],
-                'poly_title': opp['match']['poly_title'],
-                'profit_pct': opp['arbitrage']['profit_pct'],
-                'action': opp['arbitrage']['action']
-            })
+        fast_json.dump(output_data, output_file)
         
-        with open(output_file, 'w') as f:
-            json.dump(output_data, f, indent=2)
+        # Counts only, so readers don't have to parse the full opportunity list
+        fast_json.dump({
+            'generated_at': output_data['generated_at'],
+            'total_opportunities': output_data['total_opportunities']
+        }, fast_json.meta_path(output_file), indent=False)
         
         print(f"Saved {len(opportunities)} opportunities to {output_file}")
     
@@ -522,7 +797,7 @@ class ArbScanner:
                 }
             ],
             "footer": {
-                "text": f"PolyArbBot Scan • {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}"
+                "text": f"PolyArbBot Scan • {dt.datetime.now().strftime(_TIMESTAMP_FORMAT)}"
             }
         }
         
@@ -533,7 +808,7 @@ class ArbScanner:
 def main():
     parser = argparse.ArgumentParser(description='Arbitrage Scanner for Prediction Markets')
     parser.add_argument('--matches', default='strict_matches.json', help='Path to matches JSON file')
-    parser.add_argument('--kalshi', default='kalshi_markets.json', help='Path to Kalshi markets JSON')
+    parser.add_argument('--kalshi', default='kalshi_markets.json', help='Path to Kalshi markets JSON (or .parquet snapshot)')
     parser.add_argument('--polymarket', default='polymarket_current_active_gamma.json', help='Path to Polymarket markets JSON')
     parser.add_argument('--min-profit', type=float, default=2.0, help='Minimum profit percentage to report')
     parser.add_argument('--max-profit', type=float, default=50.0, help='Maximum profit percentage (filter out unrealistic opportunities)')
@@ -543,6 +818,9 @@ def main():
     
     args = parser.parse_args()
     
+    # Scan progress goes through the module logger; show it on the console
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    
     print("🚀 Starting Arbitrage Scanner...")
     print(f"📊 Matches file: {args.matches}")
     print(f"💰 Min profit: {args.min_profit}%")
@@ -576,7 +854,7 @@ def main():
     scanner.save_opportunities(opportunities, args.output)
     
     # Send summary
-    top_profit = max([opp['arbitrage']['profit_pct'] for opp in opportunities], default=0)
+    top_profit = max((arb['profit_pct'] for arb in opportunities.arbs), default=0)
     scanner.send_summary_alert(len(opportunities), top_profit)
     
     print("✅ Arbitrage scan complete!")
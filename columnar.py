@@ -0,0 +1,37 @@
+"""
+Columnar Market Snapshots
+Optional Parquet storage for market lists; requires pyarrow
+"""
+
+from typing import Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def available() -> bool:
+    """Whether pyarrow is installed"""
+    return pa is not None
+
+
+def is_parquet(path) -> bool:
+    """Whether path names a Parquet snapshot"""
+    return str(path).endswith('.parquet')
+
+
+def write_records(records: List[Dict], path, compression: str = 'zstd'):
+    """Write a list of same-shaped dicts to a Parquet file"""
+    if pa is None:
+        raise ImportError("Install pyarrow for Parquet output: pip install pyarrow")
+    pq.write_table(pa.Table.from_pylist(records), path, compression=compression)
+
+
+def read_records(path, columns: Optional[List[str]] = None) -> List[Dict]:
+    """Read a Parquet file back into a list of dicts, optionally only some columns"""
+    if pq is None:
+        raise ImportError("Install pyarrow to read Parquet files: pip install pyarrow")
+    return pq.read_table(path, columns=columns).to_pylist()
@@ -0,0 +1,206 @@
+"""
+Fast JSON Helpers
+Uses orjson when it is installed and falls back to the stdlib json module
+"""
+
+import json
+import mmap
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# One reusable simdjson parser per thread; a parser is not thread-safe
+_local = threading.local()
+
+# Array files larger than this are stream-parsed when ijson is available
+STREAM_THRESHOLD_BYTES = 50 * 1024 * 1024
+
+
+def loads(data) -> Any:
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _default(obj: Any) -> Any:
+    """Stdlib fallback for NumPy scalars and arrays"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes, optionally indented by 2 spaces
+    
+    NumPy scalars and arrays are written as plain numbers and lists.
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def load(path) -> Any:
+    """Read and parse a JSON file
+    
+    With orjson the file is memory-mapped and parsed in place, skipping the
+    read() copy of the whole file.
+    """
+    with open(path, 'rb') as f:
+        if orjson is not None:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):  # empty or unmappable file
+                return loads(f.read())
+            with mapped, memoryview(mapped) as view:
+                return orjson.loads(view)
+        return loads(f.read())
+
+
+def dump(obj: Any, path, indent: bool = True):
+    """Write obj to a JSON file"""
+    with open(path, 'wb') as f:
+        f.write(dumps(obj, indent=indent))
+
+
+def dump_array(items: Iterable[Any], path, indent: bool = True):
+    """Write items to a JSON array file one element at a time
+    
+    Only one serialized element is held in memory at once; the indented
+    layout matches dump(). The array is written to <path>.tmp and moved into
+    place only once complete, so an error partway through leaves the previous
+    file untouched.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            first = True
+            for item in items:
+                body = dumps(item, indent=indent)
+                if indent:
+                    f.write(b'[\n  ' if first else b',\n  ')
+                    # Nest the element one level; JSON strings never contain raw newlines
+                    f.write(body.replace(b'\n', b'\n  '))
+                else:
+                    f.write(b'[' if first else b',')
+                    f.write(body)
+                first = False
+            
+            if first:
+                f.write(b'[]')
+            else:
+                f.write(b'\n]' if indent else b']')
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def meta_path(path) -> str:
+    """Path of the small sidecar file summarizing a large JSON output (x.json -> x.meta.json)"""
+    root, _ = os.path.splitext(str(path))
+    return root + '.meta.json'
+
+
+def iter_array(path, threshold: int = STREAM_THRESHOLD_BYTES) -> Iterator[Any]:
+    """Yield the items of a file holding a top-level JSON array
+    
+    Files above threshold are parsed incrementally with ijson (if installed),
+    so the full array is never held in memory; smaller files go through load().
+    """
+    if ijson is not None and os.path.getsize(path) > threshold:
+        with open(path, 'rb') as f:
+            yield from ijson.items(f, 'item', use_float=True)
+    else:
+        yield from load(path)
+
+
+def iter_items(f) -> Iterator[Any]:
+    """Yield the items of a top-level JSON array read from a binary file object
+    
+    With ijson the array is parsed as bytes arrive, one item at a time;
+    otherwise the whole body is read and parsed. Parse errors raise ValueError.
+    """
+    if ijson is None:
+        data = loads(f.read())
+        if isinstance(data, list):
+            yield from data
+        return
+    try:
+        yield from ijson.items(f, 'item', use_float=True)
+    except ijson.JSONError as e:
+        raise ValueError(f"Invalid JSON: {e}") from e
+
+
+def _simd_parse(data):
+    """Parse with this thread's reusable simdjson parser"""
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = _local.parser = simdjson.Parser()
+    try:
+        return parser.parse(data)
+    except RuntimeError:
+        # Proxies from the previous document are still alive; start a fresh parser
+        parser = _local.parser = simdjson.Parser()
+        return parser.parse(data)
+
+
+def _plain(value: Any) -> Any:
+    """Convert a simdjson proxy to plain Python objects"""
+    if isinstance(value, simdjson.Array):
+        return value.as_list()
+    if isinstance(value, simdjson.Object):
+        return value.as_dict()
+    return value
+
+
+def project_items(source, keys: Sequence[str]) -> List[Dict]:
+    """Read a top-level JSON array of objects, keeping only keys
+    
+    source is either bytes already in memory or a binary file object. A file
+    object is streamed through iter_items when ijson is available, so it is
+    never read whole. In-memory bytes, or a file when ijson is missing and it
+    has to be read anyway, go to pysimdjson if it is installed: a per-thread
+    parser is reused across calls and only the wanted fields are converted
+    to Python objects. Parse errors raise ValueError.
+    """
+    if not isinstance(source, (bytes, bytearray)):
+        if ijson is not None or simdjson is None:
+            return [{key: item[key] for key in keys if key in item} for item in iter_items(source)]
+        source = source.read()
+    
+    if simdjson is None:
+        data = loads(source)
+        if not isinstance(data, list):
+            return []
+        return [{key: item[key] for key in keys if key in item} for item in data]
+    
+    doc = _simd_parse(source)
+    try:
+        if not isinstance(doc, simdjson.Array):
+            return []
+        return [{key: _plain(item[key]) for key in keys if key in item} for item in doc]
+    finally:
+        # Release the proxies so the parser can be reused for the next document
+        del doc
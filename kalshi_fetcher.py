@@ -5,16 +5,57 @@ Fetches live market data from Kalshi API for arbitrage detection
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import csv
 import datetime as dt
-from typing import List, Dict, Optional
+import functools
+import gzip
+import hashlib
+import os
+from typing import List, Dict, Optional, Set
 import argparse
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import columnar
+import fast_json
+
+# Top-level pagination cursor, read from a page before it is fully parsed
+_CURSOR_RE = re.compile(rb'"cursor"\s*:\s*"([^"\\]*)"')
+
+
+def _cents_to_prob(x) -> Optional[float]:
+    """Convert a price in cents to probability 0..1 (None if not numeric)"""
+    if x is None:
+        return None
+    try:
+        return round(float(x) / 100.0, 4)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def _iso_datetime(value: str) -> str:
+    """Normalize a Kalshi timestamp to ISO format, returning it unchanged if unparseable
+    
+    Cached because markets of the same event usually share close times.
+    """
+    try:
+        return dt.datetime.fromisoformat(value.replace('Z', '+00:00')).isoformat()
+    except ValueError:
+        return value
+
 
 class KalshiFetcher:
-    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None):
-        """Initialize fetcher. Public markets are available without auth."""
+    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None,
+                 cache_dir: Optional[str] = None):
+        """Initialize fetcher. Public markets are available without auth.
+        
+        With cache_dir, page bodies are kept on disk and revalidated with
+        ETags, so unchanged pages come back as bodiless 304s.
+        """
         self.api_key = api_key
         self.api_secret = api_secret
         # Updated public markets API endpoint
@@ -22,110 +63,198 @@ class KalshiFetcher:
         self.session = requests.Session()
         self.session.headers.update({
             'Accept': 'application/json',
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
         })
+        
+        # Keep the TLS connection warm across pages and ride out transient errors
+        retry = Retry(
+            total=5,
+            backoff_factor=0.3,
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        self.session.mount('https://', adapter)
+        
+        # Conditional-request cache: page key -> ETag, bodies under cache_dir/pages
+        self.cache_dir = cache_dir
+        self._etag_cache: Dict[str, str] = {}
+        self._used_keys: Set[str] = set()  # page keys requested in the current pass
+        if cache_dir:
+            os.makedirs(os.path.join(cache_dir, 'pages'), exist_ok=True)
+            try:
+                self._etag_cache = fast_json.load(os.path.join(cache_dir, 'etags.json'))
+            except (OSError, ValueError):
+                self._etag_cache = {}
+    
+    def _page_path(self, key: str) -> str:
+        """Cached body location for a page key"""
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'pages', f"{digest}.json.gz")
+    
+    def _save_etags(self):
+        """Persist the ETag table next to the cached pages"""
+        if self.cache_dir:
+            try:
+                fast_json.dump(self._etag_cache, os.path.join(self.cache_dir, 'etags.json'), indent=False)
+            except OSError as e:
+                print(f"Error saving Kalshi ETag cache: {e}")
+    
+    def _prune_cache(self):
+        """Drop ETags and page bodies not used by the last full pass
+        
+        Cursors change as markets do, so without this every run would leave
+        behind pages that are never requested again.
+        """
+        for key in list(self._etag_cache):
+            if key not in self._used_keys:
+                del self._etag_cache[key]
+        
+        keep = {os.path.basename(self._page_path(key)) for key in self._used_keys}
+        pages_dir = os.path.join(self.cache_dir, 'pages')
+        try:
+            for name in os.listdir(pages_dir):
+                if name not in keep:
+                    os.remove(os.path.join(pages_dir, name))
+        except OSError as e:
+            print(f"Error pruning Kalshi page cache: {e}")
+    
+    def _get_page(self, url: str, params: Dict[str, object]) -> bytes:
+        """GET one page of markets and return the raw body"""
+        if not self.cache_dir:
+            resp = self.session.get(url, params=params, timeout=30)
+            resp.raise_for_status()
+            return resp.content
+        
+        key = '&'.join(f"{k}={v}" for k, v in sorted(params.items()))
+        self._used_keys.add(key)
+        path = self._page_path(key)
+        etag = self._etag_cache.get(key)
+        headers = {'If-None-Match': etag} if etag and os.path.exists(path) else None
+        
+        resp = self.session.get(url, params=params, headers=headers, timeout=30)
+        if resp.status_code == 304:
+            # Unchanged since last fetch; reuse the stored body
+            try:
+                with gzip.open(path, 'rb') as f:
+                    return f.read()
+            except (OSError, EOFError):
+                # Stored body is unreadable, so fetch the page unconditionally
+                self._etag_cache.pop(key, None)
+                resp = self.session.get(url, params=params, timeout=30)
+        
+        resp.raise_for_status()
+        body = resp.content
+        new_etag = resp.headers.get('ETag')
+        if new_etag:
+            try:
+                with gzip.open(path, 'wb', compresslevel=1) as f:
+                    f.write(body)
+                self._etag_cache[key] = new_etag
+            except OSError:
+                self._etag_cache.pop(key, None)
+        else:
+            self._etag_cache.pop(key, None)
+        return body
     
     def get_markets(self, status: str = "open", limit: int = 500) -> List[Dict]:
-        """Fetch markets with cursor pagination from Kalshi public API."""
+        """Fetch markets with cursor pagination from Kalshi public API.
+        
+        Pages are cursor-chained, so the next request is started as soon as
+        the cursor is found in the current body and runs while it is parsed.
+        """
         url = f"{self.base_url}/markets"
         all_markets: List[Dict] = []
-        cursor: Optional[str] = None
+        self._used_keys = set()
+        complete = False
+        
+        def page_params(cursor: Optional[str]) -> Dict[str, object]:
+            params: Dict[str, object] = {'status': status, 'limit': limit}
+            if cursor:
+                params['cursor'] = cursor
+            return params
+        
         try:
-            while True:
-                params: Dict[str, object] = {'status': status, 'limit': limit}
-                if cursor:
-                    params['cursor'] = cursor
-                resp = self.session.get(url, params=params, timeout=30)
-                resp.raise_for_status()
-                data = resp.json()
-                page = data.get('markets', [])
-                if not page:
-                    break
-                all_markets.extend(page)
-                cursor = data.get('cursor')
-                if not cursor:
-                    break
-            return all_markets
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching Kalshi markets: {e}")
-            return all_markets
-        except json.JSONDecodeError as e:
-            print(f"Error parsing Kalshi JSON: {e}")
-            return all_markets
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                try:
+                    pending = executor.submit(self._get_page, url, page_params(None))
+                    while pending is not None:
+                        body = pending.result()
+                        
+                        # Prefetch the next page while this one is parsed
+                        peeked = _CURSOR_RE.search(body)
+                        next_cursor = peeked.group(1).decode() if peeked else None
+                        pending = executor.submit(self._get_page, url, page_params(next_cursor)) if next_cursor else None
+                        
+                        data = fast_json.loads(body)
+                        page = data.get('markets', [])
+                        if not page:
+                            break
+                        all_markets.extend(page)
+                        cursor = data.get('cursor')
+                        if cursor != next_cursor:
+                            # Peek disagreed with the parsed body; follow the real cursor
+                            pending = executor.submit(self._get_page, url, page_params(cursor)) if cursor else None
+                    complete = True
+                    return all_markets
+                except requests.exceptions.RequestException as e:
+                    print(f"Error fetching Kalshi markets: {e}")
+                    return all_markets
+                except ValueError as e:  # JSONDecodeError for both orjson and json
+                    print(f"Error parsing Kalshi JSON: {e}")
+                    return all_markets
+        finally:
+            # Prune only after a full pass, so an early stop keeps the later pages;
+            # remember ETags either way
+            if complete and self.cache_dir:
+                self._prune_cache()
+            self._save_etags()
     
     def normalize_market(self, market: Dict) -> Dict:
         """Normalize Kalshi market data to standard format"""
-        # Extract basic info
-        title = market.get('title', '').strip()
-        description = market.get('description', '').strip()
+        get = market.get
         
-        # Extract end date
-        end_date = market.get('close_time', '')
-        if end_date:
-            try:
-                # Convert to ISO format if needed
-                end_date = dt.datetime.fromisoformat(end_date.replace('Z', '+00:00')).isoformat()
-            except:
-                pass
+        # Extract end date (convert to ISO format if needed)
+        end_date = get('close_time') or get('latest_expiration_time') or ''
+        if isinstance(end_date, str):
+            end_date = _iso_datetime(end_date)
+        
+        # Yes side bid/ask in probability 0..1
+        yes_bid = _cents_to_prob(get('yes_bid'))
+        yes_ask = _cents_to_prob(get('yes_ask'))
+        
+        # Outcome mid prices
+        if yes_bid is not None and yes_ask is not None:
+            yes_mid = round((yes_bid + yes_ask) / 2.0, 4)
+            outcome_prices = [yes_mid, 1.0 - yes_mid]
+        else:
+            outcome_prices = []
         
-        # Convert cents to probability 0..1
-        def cents_to_prob(x):
-            try:
-                return round(float(x) / 100.0, 4)
-            except Exception:
-                return None
-
-        yes_bid = cents_to_prob(market.get('yes_bid'))
-        yes_ask = cents_to_prob(market.get('yes_ask'))
-        no_bid = cents_to_prob(market.get('no_bid'))
-        no_ask = cents_to_prob(market.get('no_ask'))
-        best_bid = yes_bid
-        best_ask = yes_ask
-
-        # Outcomes and mid prices
-        outcomes = ["Yes", "No"]
-        def mid(a, b):
-            if a is None or b is None:
-                return None
-            return round((a + b) / 2.0, 4)
-        yes_mid = mid(yes_bid, yes_ask)
-        outcome_prices = [p for p in [yes_mid, (1.0 - yes_mid) if yes_mid is not None else None] if p is not None]
-
-        # Get condition ID (ticker)
-        condition_id = market.get('ticker', '')
-
-        # Times
-        end_date = market.get('close_time') or market.get('latest_expiration_time') or ''
-        if end_date:
-            try:
-                end_date = dt.datetime.fromisoformat(end_date.replace('Z', '+00:00')).isoformat()
-            except Exception:
-                pass
-
         # Liquidity and volume (cents -> dollars for liquidity)
-        liq_raw = market.get('liquidity', 0)
         try:
-            liquidity = round(float(liq_raw) / 100.0, 2)
+            liquidity = round(float(get('liquidity', 0)) / 100.0, 2)
         except Exception:
             liquidity = 0.0
-        volume = market.get('volume', 0)
         
         return {
-            'title': title,
-            'description': description,
+            'title': get('title', '').strip(),
+            'description': get('description', '').strip(),
             'endDate': end_date,
-            'conditionId': condition_id,
-            'outcomes': outcomes,
+            'conditionId': get('ticker', ''),
+            'outcomes': ["Yes", "No"],
             'outcomePrices': outcome_prices,
-            'bestBid': best_bid,
-            'bestAsk': best_ask,
+            'bestBid': yes_bid,
+            'bestAsk': yes_ask,
             'liquidity': liquidity,
-            'volume': volume,
-            'status': market.get('status', ''),
-            'open_time': market.get('open_time', ''),
-            'close_time': market.get('close_time', ''),
-            'latest_expiration_time': market.get('latest_expiration_time', ''),
-            'tick_size': market.get('tick_size', 1)
+            'volume': get('volume', 0),
+            'status': get('status', ''),
+            'open_time': get('open_time', ''),
+            'close_time': get('close_time', ''),
+            'latest_expiration_time': get('latest_expiration_time', ''),
+            'tick_size': get('tick_size', 1)
         }
     
     def get_all_open_markets(self) -> List[Dict]:
@@ -141,13 +270,18 @@ class KalshiFetcher:
         
         print(f"Found {len(markets)} markets")
         
-        # Normalize markets
+        # Normalize markets, skipping untitled ones before doing any conversion work
         normalized_markets = []
+        normalize = self.normalize_market
+        append = normalized_markets.append
         for market in markets:
+            title = market.get('title', '')
+            if isinstance(title, str) and not title.strip():
+                continue
             try:
-                normalized = self.normalize_market(market)
+                normalized = normalize(market)
                 if normalized['title']:  # Only include markets with titles
-                    normalized_markets.append(normalized)
+                    append(normalized)
             except Exception as e:
                 print(f"Error normalizing market: {e}")
                 continue
@@ -155,49 +289,62 @@ class KalshiFetcher:
         print(f"Normalized {len(normalized_markets)} markets")
         return normalized_markets
     
-    def save_markets(self, markets: List[Dict], json_file: str, csv_file: str):
-        """Save markets to JSON and CSV files"""
-        # Save JSON
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(markets, f, indent=2, ensure_ascii=False)
-        
-        # Save CSV
-        if markets:
+    def save_markets(self, markets: List[Dict], json_file: str, csv_file: Optional[str] = None,
+                     parquet_file: Optional[str] = None):
+        """Save markets to JSON, plus CSV and/or Parquet when those files are given"""
+        # Save JSON, streamed so the full indented document is never built in memory
+        fast_json.dump_array(markets, json_file)
+        
+        # Save CSV (optional; the pipeline only reads the JSON)
+        if csv_file and markets:
             fieldnames = list(markets[0].keys())
-            with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                for market in markets:
-                    # Convert lists to pipe-delimited strings for CSV
-                    market_copy = market.copy()
-                    for key in ['outcomes', 'outcomePrices']:
-                        vals = market_copy.get(key)
-                        if isinstance(vals, list):
-                            market_copy[key] = '|'.join(map(str, vals))
-                        elif key not in market_copy:
-                            market_copy[key] = ''
-                    writer.writerow(market_copy)
-        
-        print(f"Saved {len(markets)} markets to {json_file} and {csv_file}")
+            list_keys = {'outcomes', 'outcomePrices'}
+            with open(csv_file, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
+                writer = csv.writer(f)
+                writer.writerow(fieldnames)
+                # Rows in header order; lists become pipe-delimited strings for CSV
+                writer.writerows(
+                    [
+                        '|'.join(map(str, value)) if key in list_keys and isinstance(value, list) else value
+                        for key in fieldnames
+                        for value in (market.get(key, ''),)
+                    ]
+                    for market in markets
+                )
+        
+        # Save Parquet (optional; columnar snapshot for the downstream loaders)
+        if parquet_file and markets:
+            try:
+                columnar.write_records(markets, parquet_file)
+                print(f"Saved Parquet snapshot to {parquet_file}")
+            except Exception as e:
+                print(f"Error saving Parquet snapshot: {e}")
+        
+        if csv_file:
+            print(f"Saved {len(markets)} markets to {json_file} and {csv_file}")
+        else:
+            print(f"Saved {len(markets)} markets to {json_file}")
 
 def main():
     parser = argparse.ArgumentParser(description='Fetch Kalshi market data')
     parser.add_argument('--api-key', required=False, help='Kalshi API key (optional)')
     parser.add_argument('--api-secret', required=False, help='Kalshi API secret (optional)')
     parser.add_argument('--json-file', default='kalshi_markets.json', help='Output JSON file')
-    parser.add_argument('--csv-file', default='kalshi_markets.csv', help='Output CSV file')
+    parser.add_argument('--parquet-file', default=None, help='Output Parquet file (optional, requires pyarrow)')
+    parser.add_argument('--cache-dir', default=None, help='Directory for ETag-revalidated page cache (optional)')
+    parser.add_argument('--csv-file', default=None, help='Output CSV file (optional, e.g. kalshi_markets.csv)')
     
     args = parser.parse_args()
     
     # Initialize fetcher
-    fetcher = KalshiFetcher(args.api_key, args.api_secret)
+    fetcher = KalshiFetcher(args.api_key, args.api_secret, cache_dir=args.cache_dir)
     
     # Fetch markets
     markets = fetcher.get_all_open_markets()
     
     if markets:
         # Save markets
-        fetcher.save_markets(markets, args.json_file, args.csv_file)
+        fetcher.save_markets(markets, args.json_file, args.csv_file, args.parquet_file)
         
         # Print summary
         print(f"\nSummary:")
@@ -12,15 +12,25 @@ Usage: python main.py [--dry-run] [--once]
 """
 
 import schedule
+import requests
 import time
-import subprocess
 import datetime as dt
-import json
 import logging
 import sys
+import threading
 import argparse
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
 
+import columnar
+import fast_json
+from kalshi_fetcher import KalshiFetcher
+from polymarket_fetcher import fetch_open_markets
+from strict_matcher import run_matches
+from price_fetcher import LivePriceFetcher, fetch_live
+from arb import ArbScanner
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -44,53 +54,126 @@ class PolyArbBot:
         
         # File paths
         self.kalshi_markets_file = self.base_dir / "kalshi_markets.json"
+        self.kalshi_parquet_file = self.base_dir / "kalshi_markets.parquet"
         self.poly_markets_file = self.base_dir / "polymarket_current_active_gamma.json"
         self.matches_file = self.base_dir / "strict_matches.json"
+        self.match_cache_file = self.base_dir / ".match_cache.sqlite"
         self.live_prices_file = self.base_dir / "live_prices.json"
         self.arb_file = self.base_dir / "arbitrage_opportunities.json"
         
+        # One scanner and price fetcher for the life of the bot, so their HTTP sessions
+        # (and the price fetcher's ETag cache) stay warm between polls
+        self.scanner = ArbScanner()
+        self.price_fetcher = LivePriceFetcher()
+        
+        # Keep-alive session for status posts, so they reuse the TLS connection to Discord
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'User-Agent': 'PolyArbBot/1.0'
+        })
+        
+        # Stages that timed out but whose threads are still running (description -> future).
+        # They may still write the shared JSON files, so no stage runs until they finish.
+        self._abandoned = {}
+        self._abandoned_lock = threading.Lock()
+        
         logger.info("🚀 PolyArbBot initialized")
         if dry_run:
             logger.info("🔍 Running in DRY RUN mode - no actual execution")
     
-    def run_command(self, cmd: list, description: str) -> bool:
-        """Execute a command and return success status"""
+    def _safe_call(self, fn, description: str, timeout: float = 300) -> bool:
+        """Run a pipeline stage in-process and return whether it succeeded
+        
+        The stage runs on a worker thread so a hung stage gives up after
+        timeout; the thread itself cannot be killed and is left to finish.
+        Until it does, every stage is skipped, since they share output files.
+        """
+        logger.info(f"▶️ {description}")
+        
+        if self.dry_run:
+            logger.info(f"   [DRY RUN] Would run: {description}")
+            return True
+        
+        with self._abandoned_lock:
+            for name, future in list(self._abandoned.items()):
+                if future.done():
+                    logger.info(f"🧹 Abandoned stage finished: {name}")
+                    del self._abandoned[name]
+            still_running = list(self._abandoned)
+        if still_running:
+            logger.warning(f"⏭️ Skipping {description}: abandoned stage still running ({', '.join(still_running)})")
+            return False
+        
+        start = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(fn)
         try:
-            logger.info(f"▶️ {description}")
-            
-            if self.dry_run:
-                logger.info(f"   [DRY RUN] Would execute: {' '.join(cmd)}")
-                return True
-            
-            result = subprocess.run(
-                cmd,
-                cwd=self.base_dir,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout
-            )
-            
-            if result.returncode == 0:
-                logger.info(f"✅ {description} completed successfully")
-                return True
-            else:
-                logger.error(f"❌ {description} failed:")
-                logger.error(f"   STDOUT: {result.stdout}")
-                logger.error(f"   STDERR: {result.stderr}")
-                return False
-                
-        except subprocess.TimeoutExpired:
-            logger.error(f"⏰ {description} timed out after 5 minutes")
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.error(f"⏰ {description} timed out after {timeout:.0f} seconds; "
+                         f"its thread was abandoned, not stopped, and is still running")
+            with self._abandoned_lock:
+                self._abandoned[description] = future
             return False
         except Exception as e:
             logger.error(f"💥 {description} crashed: {e}")
             return False
+        finally:
+            executor.shutdown(wait=False)
+        
+        if result:
+            logger.info(f"✅ {description} completed successfully ({time.monotonic() - start:.1f}s)")
+            return True
+        else:
+            logger.error(f"❌ {description} failed")
+            return False
+    
+    def _read_total(self, path: Path, key: str) -> int:
+        """Read a count from an output's sidecar meta file, falling back to the full file"""
+        meta = Path(fast_json.meta_path(path))
+        # The sidecar is written right after its output, so an older one is stale
+        if meta.exists() and meta.stat().st_mtime >= path.stat().st_mtime:
+            return fast_json.load(meta).get(key, 0)
+        return fast_json.load(path).get(key, 0)
+    
+    def _fetch_kalshi(self) -> bool:
+        """Fetch and save open Kalshi markets"""
+        fetcher = KalshiFetcher(cache_dir=str(self.base_dir / ".kalshi_cache"))
+        markets = fetcher.get_all_open_markets()
+        if not markets:
+            return False
+        # Also keep a columnar snapshot for the matcher when pyarrow is installed
+        parquet_file = str(self.kalshi_parquet_file) if columnar.available() else None
+        fetcher.save_markets(markets, str(self.kalshi_markets_file), parquet_file=parquet_file)
+        return True
+    
+    def _kalshi_source(self) -> Path:
+        """Kalshi snapshot for the matcher: Parquet when it is current, else JSON"""
+        if (columnar.available() and self.kalshi_parquet_file.exists()
+                and self.kalshi_parquet_file.stat().st_mtime >= self.kalshi_markets_file.stat().st_mtime):
+            return self.kalshi_parquet_file
+        return self.kalshi_markets_file
+    
+    def _scan_live(self) -> bool:
+        """Scan the matches against the latest live prices and save the opportunities"""
+        matches = self.scanner.load_matches(str(self.matches_file))
+        live_prices = self.scanner.load_live_prices(str(self.live_prices_file))
+        
+        if not matches or not live_prices:
+            logger.error("❌ Failed to load matches or live prices")
+            return False
+        
+        opportunities = self.scanner.scan_for_arbitrage_with_live_prices(
+            matches, live_prices,
+            min_profit_pct=0.5, max_profit_pct=15.0, max_alerts=3
+        )
+        self.scanner.save_opportunities(opportunities, str(self.arb_file))
+        return True
     
     def send_status_update(self, message: str, is_error: bool = False):
         """Send status update to Discord"""
         try:
-            import requests
-            
             color = 0xFF0000 if is_error else 0x00FF00
             embed = {
                 "title": "🤖 PolyArbBot Status",
@@ -103,7 +186,7 @@ class PolyArbBot:
             payload = {"embeds": [embed]}
             
             if not self.dry_run:
-                response = requests.post(DISCORD_WEBHOOK, json=payload, timeout=10)
+                response = self.session.post(DISCORD_WEBHOOK, data=fast_json.dumps(payload), timeout=10)
                 if response.status_code == 204:
                     logger.info("📢 Status update sent to Discord")
                 else:
@@ -118,17 +201,16 @@ class PolyArbBot:
         """Fetch fresh market data from both platforms"""
         logger.info("🔄 Starting market data update...")
         
-        # Fetch Kalshi markets
-        kalshi_success = self.run_command(
-            ["python", "kalshi_fetcher.py", "--json-file", str(self.kalshi_markets_file)],
-            "Fetching Kalshi markets"
-        )
-        
-        # Fetch Polymarket markets  
-        poly_success = self.run_command(
-            ["python", "polymarket_fetcher.py"],
-            "Fetching Polymarket markets"
-        )
+        # Fetch both platforms at once; they hit different hosts and mostly wait on the network
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            kalshi_future = executor.submit(self._safe_call, self._fetch_kalshi, "Fetching Kalshi markets")
+            poly_future = executor.submit(
+                self._safe_call,
+                lambda: fetch_open_markets(str(self.poly_markets_file.with_suffix(''))),
+                "Fetching Polymarket markets"
+            )
+            kalshi_success = kalshi_future.result()
+            poly_success = poly_future.result()
         
         success = kalshi_success and poly_success
         
@@ -146,8 +228,11 @@ class PolyArbBot:
         """Update market matches using the strict matcher"""
         logger.info("🔍 Updating market matches...")
         
-        success = self.run_command(
-            ["python", "strict_matcher.py"],
+        success = self._safe_call(
+            lambda: run_matches(
+                str(self._kalshi_source()), str(self.poly_markets_file), str(self.matches_file),
+                cache_path=str(self.match_cache_file)
+            ) is not None,
             "Updating market matches"
         )
         
@@ -156,9 +241,7 @@ class PolyArbBot:
             
             # Log match count
             try:
-                with open(self.matches_file) as f:
-                    data = json.load(f)
-                match_count = data.get('total_matches', 0)
+                match_count = self._read_total(self.matches_file, 'total_matches')
                 logger.info(f"📈 Found {match_count} quality market matches")
                 self.send_status_update(f"🎯 Updated market matches: {match_count} quality pairs found")
             except Exception as e:
@@ -173,10 +256,8 @@ class PolyArbBot:
         """Fetch live prices for matched markets"""
         logger.info("💰 Fetching live prices...")
         
-        success = self.run_command(
-            ["python", "price_fetcher.py",
-             "--matches", str(self.matches_file),
-             "--output", str(self.live_prices_file)],
+        success = self._safe_call(
+            lambda: fetch_live(str(self.matches_file), str(self.live_prices_file), self.price_fetcher) is not None,
             "Fetching live prices"
         )
         
@@ -196,29 +277,7 @@ class PolyArbBot:
         if not self.fetch_live_prices():
             return False
         
-        success = self.run_command(
-            ["python", "-c", f"""
-import sys
-sys.path.append('{self.base_dir}')
-from arb import ArbScanner
-import json
-
-scanner = ArbScanner()
-matches = scanner.load_matches('{self.matches_file}')
-live_prices = scanner.load_live_prices('{self.live_prices_file}')
-
-if matches and live_prices:
-    opportunities = scanner.scan_for_arbitrage_with_live_prices(
-        matches, live_prices, 
-        min_profit_pct=0.5, max_profit_pct=15.0, max_alerts=3
-    )
-    scanner.save_opportunities(opportunities, '{self.arb_file}')
-    print(f'Found {{len(opportunities)}} opportunities')
-else:
-    print('Failed to load matches or live prices')
-"""],
-            "Scanning for arbitrage with live prices"
-        )
+        success = self._safe_call(self._scan_live, "Scanning for arbitrage with live prices")
         
         if success:
             self.last_arb_scan = dt.datetime.now()
@@ -226,9 +285,7 @@ else:
             
             # Log opportunity count
             try:
-                with open(self.arb_file) as f:
-                    data = json.load(f)
-                opp_count = data.get('total_opportunities', 0)
+                opp_count = self._read_total(self.arb_file, 'total_opportunities')
                 logger.info(f"💎 Found {opp_count} arbitrage opportunities")
                 
                 if opp_count == 0:
@@ -279,62 +336,51 @@ else:
         logger.info("📊 Generating status report...")
         
         try:
-            # Market data status
-            kalshi_exists = self.kalshi_markets_file.exists()
-            poly_exists = self.poly_markets_file.exists()
-            matches_exist = self.matches_file.exists()
-            
-            # File ages
-            kalshi_age = "N/A"
-            poly_age = "N/A" 
-            matches_age = "N/A"
+            now = time.time()
             
-            if kalshi_exists:
-                kalshi_age = time.time() - self.kalshi_markets_file.stat().st_mtime
-                kalshi_age = f"{kalshi_age/3600:.1f}h ago"
+            def file_status(path: Path) -> str:
+                """'✅ (<age>h ago)' or '❌ (N/A)', from a single stat() call"""
+                try:
+                    age = now - path.stat().st_mtime
+                except OSError:
+                    return "❌ (N/A)"
+                return f"✅ ({age/3600:.1f}h ago)"
             
-            if poly_exists:
-                poly_age = time.time() - self.poly_markets_file.stat().st_mtime
-                poly_age = f"{poly_age/3600:.1f}h ago"
-                
-            if matches_exist:
-                matches_age = time.time() - self.matches_file.stat().st_mtime
-                matches_age = f"{matches_age/3600:.1f}h ago"
+            def clock(when: Optional[dt.datetime]) -> str:
+                return when.strftime('%H:%M UTC') if when else 'Never'
             
             # Match and opportunity counts
             match_count = 0
             opp_count = 0
             
-            if matches_exist:
+            if self.matches_file.exists():
                 try:
-                    with open(self.matches_file) as f:
-                        data = json.load(f)
-                    match_count = data.get('total_matches', 0)
+                    match_count = self._read_total(self.matches_file, 'total_matches')
                 except:
                     pass
             
             if self.arb_file.exists():
                 try:
-                    with open(self.arb_file) as f:
-                        data = json.load(f)
-                    opp_count = data.get('total_opportunities', 0)
+                    opp_count = self._read_total(self.arb_file, 'total_opportunities')
                 except:
                     pass
             
-            status_msg = f"""📊 **PolyArbBot Status Report**
-
-**Market Data:**
-• Kalshi: {'✅' if kalshi_exists else '❌'} ({kalshi_age})
-• Polymarket: {'✅' if poly_exists else '❌'} ({poly_age})
-• Matches: {'✅' if matches_exist else '❌'} ({matches_age})
-
-**Current Stats:**
-• Market pairs: {match_count}
-• Active opportunities: {opp_count}
-
-**Last Updates:**
-• Market data: {self.last_market_update.strftime('%H:%M UTC') if self.last_market_update else 'Never'}
-• Arbitrage scan: {self.last_arb_scan.strftime('%H:%M UTC') if self.last_arb_scan else 'Never'}"""
+            status_msg = "\n".join([
+                "📊 **PolyArbBot Status Report**",
+                "",
+                "**Market Data:**",
+                f"• Kalshi: {file_status(self.kalshi_markets_file)}",
+                f"• Polymarket: {file_status(self.poly_markets_file)}",
+                f"• Matches: {file_status(self.matches_file)}",
+                "",
+                "**Current Stats:**",
+                f"• Market pairs: {match_count}",
+                f"• Active opportunities: {opp_count}",
+                "",
+                "**Last Updates:**",
+                f"• Market data: {clock(self.last_market_update)}",
+                f"• Arbitrage scan: {clock(self.last_arb_scan)}"
+            ])
             
             self.send_status_update(status_msg)
             
@@ -377,7 +423,12 @@ else:
         try:
             while True:
                 schedule.run_pending()
-                time.sleep(60)  # Check every minute
+                idle = schedule.idle_seconds()
+                if idle is None:
+                    logger.warning("⚠️ No scheduled jobs left - leaving scheduler loop")
+                    break
+                # Sleep until the next job is due, waking at least once a minute
+                time.sleep(max(1, min(idle, 60)))
                 
         except KeyboardInterrupt:
             logger.info("🛑 Scheduler stopped by user")
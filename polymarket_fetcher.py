@@ -5,10 +5,90 @@ Gets current active markets from Polymarket for arbitrage analysis.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.util.retry import Retry
+import csv
+import itertools
 import json
-from typing import Dict, List, Optional
+import os
+import sys
+from collections import ChainMap, Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
 from datetime import datetime, timezone
 
+import numpy as np
+
+import fast_json
+
+# Market fields read by this module, strict_matcher and arb; the rest are dropped while paging
+NEEDED_KEYS = (
+    'id', 'question', 'description', 'conditionId', 'category', 'endDate',
+    'active', 'closed', 'archived', 'volume', 'liquidity', 'outcomes', 'outcomePrices',
+)
+
+# Fixed per-market lines of format_market_data; missing keys print as N/A
+_MARKET_TEMPLATE = (
+    "\n{i}. {question}\n"
+    "   Market ID: {id}\n"
+    "   Condition ID: {conditionId}\n"
+    "   Active: {active}\n"
+    "   Closed: {closed}\n"
+    "   Archived: {archived}\n"
+    "   End Date: {endDate}\n"
+)
+_MARKET_DEFAULTS = dict.fromkeys(('question', 'id', 'conditionId', 'active', 'closed', 'archived', 'endDate'), 'N/A')
+
+
+def _end_timestamp(end_str: str) -> Optional[float]:
+    """UTC epoch seconds of a Polymarket endDate, or None if it has no usable timezone
+    
+    The usual YYYY-MM-DDTHH:MM:SSZ form is sliced directly; anything else goes
+    through fromisoformat.
+    """
+    if len(end_str) == 20 and end_str[19] == 'Z' and end_str[10] == 'T':
+        try:
+            # datetime() range-checks every field, so 02-30 or 25:61 is still rejected
+            return datetime(
+                int(end_str[0:4]), int(end_str[5:7]), int(end_str[8:10]),
+                int(end_str[11:13]), int(end_str[14:16]), int(end_str[17:19]),
+                tzinfo=timezone.utc,
+            ).timestamp()
+        except ValueError:
+            pass
+    end_dt = datetime.fromisoformat(end_str.replace('Z', '+00:00'))
+    if end_dt.tzinfo is None:
+        # Naive times can't be compared with the UTC clock
+        return None
+    return end_dt.timestamp()
+
+
+class MarketRow(NamedTuple):
+    """Fields of one market used for filtering and analysis, extracted once"""
+    market: Dict
+    question: Any
+    end_date: Any
+    end_ts: Optional[float]
+    category: Any
+
+
+def market_row(market: Dict) -> MarketRow:
+    """Project a market dict to a MarketRow, parsing its endDate a single time"""
+    end_date = market.get('endDate', '')
+    end_ts = None
+    if end_date:
+        try:
+            end_ts = _end_timestamp(end_date)
+        except Exception:
+            pass
+    return MarketRow(market, market.get('question', 'N/A'), end_date, end_ts, market.get('category', 'Unknown'))
+
+
+def _as_row(item) -> MarketRow:
+    """Accept either a market dict or an already projected MarketRow"""
+    return item if isinstance(item, MarketRow) else market_row(item)
+
 
 class PolymarketFetcher:
     """Class to fetch current active markets from Polymarket for arbitrage analysis."""
@@ -18,8 +98,21 @@ class PolymarketFetcher:
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'PolyArbBot/1.0',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
         })
+        
+        # Pooled keep-alive connections for concurrent page fetches; retry gateway errors
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry)
+        self.session.mount('https://', adapter)
     
     def get_current_markets(self, limit: int = 1000) -> List[Dict]:
         """
@@ -42,7 +135,7 @@ class PolymarketFetcher:
             response = self.session.get(url, params=params, timeout=15)
             response.raise_for_status()
             
-            return response.json()
+            return fast_json.loads(response.content)
             
         except requests.exceptions.RequestException as e:
             print(f"Error fetching current markets: {e}")
@@ -68,70 +161,97 @@ class PolymarketFetcher:
             response = self.session.get(url, params=params, timeout=15)
             response.raise_for_status()
             
-            return response.json()
+            return fast_json.loads(response.content)
             
         except requests.exceptions.RequestException as e:
             print(f"Error fetching all markets: {e}")
             return []
 
-    def get_all_open_markets(self, page_limit: int = 500, end_date_min: Optional[str] = None) -> List[Dict]:
+    def iter_open_markets(self, page_limit: int = 500, end_date_min: Optional[str] = None,
+                          max_workers: int = 8) -> Iterator[Dict]:
         """
-        Fetch ALL open markets using Gamma API pagination.
+        Yield ALL open markets using Gamma API pagination, page by page as they arrive.
+        
+        The first page is fetched on its own; later pages are requested
+        max_workers offsets at a time and yielded in offset order until a
+        page comes back shorter than page_limit.
 
         Args:
             page_limit: Number of markets per request (Gamma max is 500)
             end_date_min: Optional ISO date string (e.g., "2025-01-01T00:00:00Z") to filter to future markets server-side
+            max_workers: Number of pages fetched concurrently
 
-        Returns:
-            List of open (closed=false) market dictionaries across all pages
+        Yields:
+            Open (closed=false) market dictionaries across all pages
         """
-        all_markets: List[Dict] = []
-        offset: int = 0
+        url = f"{self.base_url}/markets"
 
-        while True:
-            try:
-                url = f"{self.base_url}/markets"
-                params: Dict[str, object] = {
-                    'closed': 'false',
-                    'limit': page_limit,
-                    'offset': offset,
-                }
-                if end_date_min:
-                    params['end_date_min'] = end_date_min
+        def fetch(offset: int) -> List[Dict]:
+            params: Dict[str, object] = {
+                'closed': 'false',
+                'limit': page_limit,
+                'offset': offset,
+            }
+            if end_date_min:
+                params['end_date_min'] = end_date_min
 
-                resp = self.session.get(url, params=params, timeout=20)
+            # Parse the page and keep only the fields that are used downstream
+            with self.session.get(url, params=params, timeout=20, stream=True) as resp:
                 resp.raise_for_status()
-                page = resp.json()
-
-                if not page:
-                    break
-
-                all_markets.extend(page)
-                offset += page_limit
+                resp.raw.decode_content = True
+                try:
+                    return fast_json.project_items(resp.raw, NEEDED_KEYS)
+                except urllib3.exceptions.HTTPError as e:
+                    raise requests.exceptions.ConnectionError(e) from e
 
+        def result_page(offset: int, result) -> Optional[List[Dict]]:
+            """A fetched page, or None if it failed"""
+            try:
+                return result()
             except requests.exceptions.RequestException as e:
                 print(f"Error fetching open markets (offset={offset}): {e}")
-                break
-            except json.JSONDecodeError as e:
+            except ValueError as e:  # JSONDecodeError for both orjson and json, or ijson errors
                 print(f"Error parsing JSON (offset={offset}): {e}")
-                break
+            return None
 
-        return all_markets
+        # Probe the first page alone so a failing endpoint costs one request
+        page = result_page(0, lambda: fetch(0))
+        if page is None:
+            return
+        yield from page
+        # A short page is the last one, so no trailing empty request is needed
+        if len(page) < page_limit:
+            return
 
-    def filter_future_markets(self, markets: List[Dict]) -> List[Dict]:
-        """Return markets with endDate strictly in the future (UTC)."""
-        future: List[Dict] = []
-        now = datetime.now(timezone.utc)
-        for m in markets:
-            end_str = m.get('endDate')
-            if not end_str:
-                continue
-            try:
-                end_dt = datetime.fromisoformat(end_str.replace('Z', '+00:00'))
-            except Exception:
-                continue
-            if end_dt > now:
-                future.append(m)
+        offset = page_limit
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                batch = [
+                    (page_offset, executor.submit(fetch, page_offset))
+                    for page_offset in range(offset, offset + max_workers * page_limit, page_limit)
+                ]
+                for page_offset, future in batch:
+                    page = result_page(page_offset, future.result)
+                    if page is None:
+                        return
+                    yield from page
+                    if len(page) < page_limit:
+                        return
+                offset += max_workers * page_limit
+
+    def get_all_open_markets(self, page_limit: int = 500, end_date_min: Optional[str] = None,
+                             max_workers: int = 8) -> List[Dict]:
+        """Fetch ALL open markets into a list (see iter_open_markets)"""
+        return list(self.iter_open_markets(page_limit, end_date_min, max_workers))
+
+    def filter_future_markets(self, markets: Iterable) -> List:
+        """Return markets (dicts or MarketRows) with endDate strictly in the future (UTC)."""
+        now_ts = datetime.now(timezone.utc).timestamp()
+        future = []
+        for item in markets:
+            end_ts = _as_row(item).end_ts
+            if end_ts is not None and end_ts > now_ts:
+                future.append(item)
         return future
     
     def format_market_data(self, markets: List[Dict]) -> None:
@@ -145,102 +265,120 @@ class PolymarketFetcher:
             print("No markets found.")
             return
         
-        print(f"\n{'='*100}")
-        print(f"CURRENT ACTIVE MARKETS ({len(markets)} found)")
-        print(f"{'='*100}")
-        
+        # The whole listing is built in memory and written to stdout once
+        chunks: List[str] = [f"\n{'='*100}\nCURRENT ACTIVE MARKETS ({len(markets)} found)\n{'='*100}\n"]
+        append = chunks.append
+        separator = "-" * 80 + "\n"
         for i, market in enumerate(markets, 1):
-            print(f"\n{i}. {market.get('question', 'N/A')}")
-            print(f"   Market ID: {market.get('id', 'N/A')}")
-            print(f"   Condition ID: {market.get('conditionId', 'N/A')}")
-            print(f"   Active: {market.get('active', 'N/A')}")
-            print(f"   Closed: {market.get('closed', 'N/A')}")
-            print(f"   Archived: {market.get('archived', 'N/A')}")
-            print(f"   End Date: {market.get('endDate', 'N/A')}")
+            get = market.get
+            append(_MARKET_TEMPLATE.format_map(ChainMap({'i': i}, market, _MARKET_DEFAULTS)))
             
             # Handle volume and liquidity
-            volume = market.get('volume', 0)
-            liquidity = market.get('liquidity', 0)
+            volume = get('volume', 0)
+            liquidity = get('liquidity', 0)
             try:
                 volume_float = float(volume) if volume else 0
                 liquidity_float = float(liquidity) if liquidity else 0
-                print(f"   Volume: ${volume_float:,.2f}")
-                print(f"   Liquidity: ${liquidity_float:,.2f}")
-            except:
-                print(f"   Volume: {volume}")
-                print(f"   Liquidity: {liquidity}")
+                append(f"   Volume: ${volume_float:,.2f}\n   Liquidity: ${liquidity_float:,.2f}\n")
+            except Exception:
+                append(f"   Volume: {volume}\n   Liquidity: {liquidity}\n")
             
             # Show outcome prices if available
-            outcomes = market.get('outcomes', [])
-            outcome_prices = market.get('outcomePrices', [])
+            outcomes = get('outcomes', [])
+            outcome_prices = get('outcomePrices', [])
             
             if outcomes and outcome_prices and len(outcomes) == len(outcome_prices):
-                print("   Outcomes:")
+                append("   Outcomes:\n")
                 for outcome, price in zip(outcomes, outcome_prices):
                     try:
                         price_float = float(price)
-                        print(f"     - {outcome}: ${price_float:.4f}")
-                    except:
-                        print(f"     - {outcome}: {price}")
+                        append(f"     - {outcome}: ${price_float:.4f}\n")
+                    except Exception:
+                        append(f"     - {outcome}: {price}\n")
             
-            print("-" * 80)
+            append(separator)
+        
+        sys.stdout.write(''.join(chunks))
+        sys.stdout.flush()
     
-    def save_to_files(self, markets: List[Dict], filename_prefix: str = "current_markets") -> None:
+    def save_to_files(self, markets: Iterable[Dict], filename_prefix: str = "current_markets") -> int:
         """
         Save markets to JSON and CSV files.
         
+        The markets are consumed once and both files are written as they go,
+        so a generator (e.g. iter_open_markets) is never held in memory.
+        
         Args:
-            markets: List of market dictionaries
+            markets: Iterable of market dictionaries
             filename_prefix: Prefix for the output files
+            
+        Returns:
+            Number of markets saved
         """
-        if not markets:
+        markets = iter(markets)
+        first = next(markets, None)
+        if first is None:
             print("No markets to save.")
-            return
+            return 0
         
-        # Save JSON
         json_filename = f"{filename_prefix}.json"
-        with open(json_filename, 'w') as f:
-            json.dump(markets, f, indent=2)
-        print(f"Saved {len(markets)} markets to {json_filename}")
-        
-        # Save CSV
         csv_filename = f"{filename_prefix}.csv"
-        with open(csv_filename, 'w') as f:
-            f.write("Question,Market_ID,Condition_ID,Active,Closed,Archived,End_Date,Volume,Liquidity,Outcomes\n")
-            
-            for market in markets:
-                question = market.get('question', '').replace('"', '""')
-                market_id = market.get('id', '')
-                condition_id = market.get('conditionId', '')
-                active = market.get('active', False)
-                closed = market.get('closed', False)
-                archived = market.get('archived', False)
-                end_date = market.get('endDate', '')
-                volume = market.get('volume', 0)
-                liquidity = market.get('liquidity', 0)
+        count = 0
+        
+        # Both files are written beside the old ones and only replace them once
+        # every page has arrived, so a failed fetch keeps the last good snapshot
+        csv_tmp = f"{csv_filename}.tmp"
+        try:
+            with open(csv_tmp, 'w', newline='', buffering=1 << 20) as f:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerow(["Question", "Market_ID", "Condition_ID", "Active", "Closed", "Archived",
+                                 "End_Date", "Volume", "Liquidity", "Outcomes"])
                 
-                # Format outcomes
-                outcomes = market.get('outcomes', [])
-                outcome_prices = market.get('outcomePrices', [])
-                outcomes_str = ""
-                if outcomes and outcome_prices and len(outcomes) == len(outcome_prices):
-                    outcome_list = []
-                    for outcome, price in zip(outcomes, outcome_prices):
-                        outcome_list.append(f"{outcome}:{price}")
-                    outcomes_str = "|".join(outcome_list)
+                def written():
+                    """Pass markets through to the JSON writer, writing each CSV row on the way"""
+                    nonlocal count
+                    for market in itertools.chain((first,), markets):
+                        get = market.get
+                        
+                        # Format outcomes
+                        outcomes = get('outcomes', [])
+                        outcome_prices = get('outcomePrices', [])
+                        outcomes_str = ""
+                        if outcomes and outcome_prices and len(outcomes) == len(outcome_prices):
+                            outcomes_str = "|".join(f"{outcome}:{price}" for outcome, price in zip(outcomes, outcome_prices))
+                        
+                        writer.writerow((get('question', ''), get('id', ''), get('conditionId', ''),
+                                         get('active', False), get('closed', False), get('archived', False),
+                                         get('endDate', ''), get('volume', 0), get('liquidity', 0), outcomes_str))
+                        count += 1
+                        yield market
                 
-                f.write(f'"{question}",{market_id},{condition_id},{active},{closed},{archived},{end_date},{volume},{liquidity},"{outcomes_str}"\n')
+                fast_json.dump_array(written(), json_filename)
+            
+            os.replace(csv_tmp, csv_filename)
+        except BaseException:
+            try:
+                os.remove(csv_tmp)
+            except OSError:
+                pass
+            raise
         
+        print(f"Saved {count} markets to {json_filename}")
         print(f"Saved CSV to {csv_filename}")
+        return count
     
-    def analyze_markets(self, markets: List[Dict]) -> None:
+    def analyze_markets(self, markets: Iterable[Dict]) -> None:
         """
         Analyze and display statistics about the markets.
         
+        All statistics are gathered in a single pass, so markets may be a generator.
+        
         Args:
-            markets: List of market dictionaries
+            markets: Iterable of market dictionaries or MarketRows
         """
-        if not markets:
+        markets = iter(markets)
+        first = next(markets, None)
+        if first is None:
             print("No markets to analyze.")
             return
         
@@ -248,51 +386,58 @@ class PolymarketFetcher:
         print("MARKET ANALYSIS:")
         print(f"{'='*100}")
         
-        # Count by end date year
-        year_counts = {}
-        for market in markets:
-            end_date = market.get('endDate', '')
-            if end_date:
-                year = end_date[:4]
-                year_counts[year] = year_counts.get(year, 0) + 1
+        # Count by end date year and by category; collect end timestamps for the window below
+        year_counts = Counter()
+        category_counts = Counter()
+        end_times: List[float] = []
+        questions: List[Any] = []
+        
+        for row in map(_as_row, itertools.chain((first,), markets)):
+            category_counts[row.category] += 1
+            
+            if row.end_date:
+                year_counts[row.end_date[:4]] += 1
+            if row.end_ts is not None:
+                end_times.append(row.end_ts)
+                questions.append(row.question)
         
         print("Markets by end date year:")
         for year in sorted(year_counts.keys()):
             print(f"  {year}: {year_counts[year]} markets")
         
-        # Count by category
-        category_counts = {}
-        for market in markets:
-            category = market.get('category', 'Unknown')
-            category_counts[category] = category_counts.get(category, 0) + 1
-        
         print("\nMarkets by category:")
         for category, count in sorted(category_counts.items()):
             print(f"  {category}: {count} markets")
         
-        # Show markets ending soon (next 30 days)
-        current_time = datetime.now(timezone.utc)
-        soon_markets = []
+        # Markets ending soon (next 30 days), as whole days left, soonest first
+        now_ts = datetime.now(timezone.utc).timestamp()
+        days_until_end = np.floor((np.array(end_times, dtype=np.float64) - now_ts) / 86400)
+        soon = np.flatnonzero((days_until_end >= 0) & (days_until_end <= 30))
+        soon = soon[np.argsort(days_until_end[soon], kind='stable')]
         
-        for market in markets:
-            end_date_str = market.get('endDate', '')
-            if end_date_str:
-                try:
-                    end_date = datetime.fromisoformat(end_date_str.replace('Z', '+00:00'))
-                    days_until_end = (end_date - current_time).days
-                    if 0 <= days_until_end <= 30:
-                        soon_markets.append((market, days_until_end))
-                except:
-                    continue
-        
-        if soon_markets:
-            print(f"\nMarkets ending in the next 30 days ({len(soon_markets)}):")
-            for market, days in sorted(soon_markets, key=lambda x: x[1]):
-                print(f"  {days} days: {market.get('question', 'N/A')}")
+        if soon.size:
+            print(f"\nMarkets ending in the next 30 days ({soon.size}):")
+            for i in soon:
+                print(f"  {int(days_until_end[i])} days: {questions[i]}")
         else:
             print(f"\nNo markets ending in the next 30 days.")
 
 
+def fetch_open_markets(filename_prefix: str = "polymarket_current_active_gamma",
+                       api: Optional[PolymarketFetcher] = None) -> int:
+    """Stream all open markets into <filename_prefix>.json/.csv and return how many were saved"""
+    api = api or PolymarketFetcher()
+    
+    # Get ALL open markets with pagination (target ~1200+); pages go straight to disk
+    print("Fetching all open markets (closed=false) with pagination...")
+    saved = api.save_to_files(api.iter_open_markets(page_limit=500), filename_prefix)
+    
+    if saved:
+        print(f"Found {saved} open markets (closed=false)!")
+    
+    return saved
+
+
 def main():
     """Main function to fetch current Polymarket data for arbitrage analysis."""
     print("Polymarket Arbitrage Bot - Market Data Fetcher")
@@ -300,7 +445,8 @@ def main():
     
     api = PolymarketFetcher()
     
-    # Get ALL open markets with pagination (target ~1200+)
+    # Get ALL open markets with pagination; kept in memory here for display.
+    # Ended-but-open markets can still trade, so the saved file keeps them too
     print("Fetching all open markets (closed=false) with pagination...")
     all_open = api.get_all_open_markets(page_limit=500)
     
@@ -314,8 +460,9 @@ def main():
         api.format_market_data(all_open[:500])
         
         # Analyze markets
-        # Filter to future end dates
-        future_only = api.filter_future_markets(all_open)
+        # Parse end dates once, then filter to future end dates for the analysis only
+        rows = [market_row(market) for market in all_open]
+        future_only = api.filter_future_markets(rows)
         print(f"\nFuture-dated markets: {len(future_only)}")
         api.analyze_markets(future_only)
         
@@ -4,42 +4,160 @@ Live Price Fetcher
 Fetches current prices for matched markets every 10 minutes
 """
 
-import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
 import time
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlencode
 import logging
 
+import fast_json
+
 logger = logging.getLogger(__name__)
 
+
+class _RateLimiter:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts of `burst`"""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Take a token, sleeping only when the bucket is empty"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Going negative reserves a future token, so waiting threads queue up in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        
+        if wait:
+            time.sleep(wait)
+
+
+KALSHI_MARKETS_URL = "https://api.elections.kalshi.com/trade-api/v2/markets"
+POLY_MARKETS_URL = "https://gamma-api.polymarket.com/markets"
+
+
+def _kalshi_quote(market_id: str, market: Dict) -> Dict:
+    """Live price record from a Kalshi market object (cents -> 0..1)"""
+    return {
+        'market_id': market_id,
+        'yes_bid': market.get('yes_bid', 0) / 100.0 if market.get('yes_bid') else None,
+        'yes_ask': market.get('yes_ask', 0) / 100.0 if market.get('yes_ask') else None,
+        'no_bid': market.get('no_bid', 0) / 100.0 if market.get('no_bid') else None,
+        'no_ask': market.get('no_ask', 0) / 100.0 if market.get('no_ask') else None,
+        'last_updated': time.time()
+    }
+
+
+def _poly_quote(market_id: str, market: Dict) -> Optional[Dict]:
+    """Live price record from a Gamma market object (None without two outcome prices)"""
+    outcome_prices = market.get('outcomePrices', [])
+    
+    if isinstance(outcome_prices, str):
+        try:
+            outcome_prices = fast_json.loads(outcome_prices)
+        except ValueError:
+            outcome_prices = []
+    
+    if len(outcome_prices) < 2:
+        return None
+    return {
+        'market_id': market_id,
+        'yes_price': _outcome_price(outcome_prices[0]),
+        'no_price': _outcome_price(outcome_prices[1]),
+        'last_updated': time.time()
+    }
+
+
+def _outcome_price(value) -> Optional[float]:
+    """Polymarket outcome price as a 0..1 probability (None if blank)"""
+    if not value:
+        return None
+    price = float(value)
+    # Convert to 0-1 if needed
+    return price / 100.0 if price > 1 else price
+
+
 class LivePriceFetcher:
-    def __init__(self):
+    def __init__(self, max_workers: int = 16, requests_per_second: float = 10.0,
+                 progress_interval: float = 2.0, batch_size: int = 100):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'PolyArbBot/1.0',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
         })
+        
+        # Enough pooled connections per host for every worker thread
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=retry)
+        self.session.mount('https://', adapter)
+        
+        # Requests overlap across worker threads; each API gets its own rate budget
+        self.max_workers = max_workers
+        self.progress_interval = progress_interval
+        self.batch_size = batch_size
+        
+        # Conditional-request cache: request key -> (ETag, parsed body); kept for the
+        # fetcher's lifetime so repeated polls can be answered with 304s
+        self._etag_cache: Dict[str, Tuple[str, Any]] = {}
+        self._etag_seen: Set[str] = set()
+        self._kalshi_limiter = _RateLimiter(requests_per_second, burst=max_workers)
+        self._poly_limiter = _RateLimiter(requests_per_second, burst=max_workers)
+    
+    def _get_json(self, url: str, params=None) -> Tuple[int, Any]:
+        """GET url and return (status, parsed body), revalidating a previous body by ETag
+        
+        A 304 reuses the body parsed last time, so unchanged markets cost
+        neither payload nor parsing. The body is None unless status is 200.
+        """
+        key = url if params is None else f"{url}?{urlencode(params)}"
+        self._etag_seen.add(key)
+        cached = self._etag_cache.get(key)
+        headers = {'If-None-Match': cached[0]} if cached else None
+        
+        response = self.session.get(url, params=params, headers=headers, timeout=10)
+        if response.status_code == 304 and cached:
+            return 200, cached[1]
+        if response.status_code != 200:
+            self._etag_cache.pop(key, None)
+            return response.status_code, None
+        
+        data = fast_json.loads(response.content)
+        etag = response.headers.get('ETag')
+        if etag:
+            self._etag_cache[key] = (etag, data)
+        else:
+            self._etag_cache.pop(key, None)
+        return 200, data
     
     def fetch_kalshi_market_price(self, market_id: str) -> Optional[Dict]:
         """Fetch current price for a specific Kalshi market"""
         try:
-            url = f"https://api.elections.kalshi.com/trade-api/v2/markets/{market_id}"
-            response = self.session.get(url, timeout=10)
+            self._kalshi_limiter.acquire()
+            status, data = self._get_json(f"{KALSHI_MARKETS_URL}/{market_id}")
             
-            if response.status_code == 200:
-                data = response.json()
-                market = data.get('market', {})
-                
-                return {
-                    'market_id': market_id,
-                    'yes_bid': market.get('yes_bid', 0) / 100.0 if market.get('yes_bid') else None,
-                    'yes_ask': market.get('yes_ask', 0) / 100.0 if market.get('yes_ask') else None,
-                    'no_bid': market.get('no_bid', 0) / 100.0 if market.get('no_bid') else None,
-                    'no_ask': market.get('no_ask', 0) / 100.0 if market.get('no_ask') else None,
-                    'last_updated': time.time()
-                }
+            if status == 200:
+                return _kalshi_quote(market_id, data.get('market', {}))
             else:
-                logger.warning(f"Kalshi API error for {market_id}: {response.status_code}")
+                logger.warning(f"Kalshi API error for {market_id}: {status}")
                 return None
                 
         except Exception as e:
@@ -49,44 +167,113 @@ class LivePriceFetcher:
     def fetch_polymarket_price(self, market_id: str) -> Optional[Dict]:
         """Fetch current price for a specific Polymarket market"""
         try:
+            self._poly_limiter.acquire()
+            
             # Try the Gamma API first
-            url = f"https://gamma-api.polymarket.com/markets/{market_id}"
-            response = self.session.get(url, timeout=10)
+            status, market = self._get_json(f"{POLY_MARKETS_URL}/{market_id}")
             
-            if response.status_code == 200:
-                market = response.json()
-                outcome_prices = market.get('outcomePrices', [])
-                
-                if isinstance(outcome_prices, str):
-                    try:
-                        outcome_prices = json.loads(outcome_prices)
-                    except:
-                        outcome_prices = []
-                
-                if len(outcome_prices) >= 2:
-                    yes_price = float(outcome_prices[0]) if outcome_prices[0] else None
-                    no_price = float(outcome_prices[1]) if outcome_prices[1] else None
-                    
-                    # Convert to 0-1 if needed
-                    if yes_price and yes_price > 1:
-                        yes_price = yes_price / 100.0
-                    if no_price and no_price > 1:
-                        no_price = no_price / 100.0
-                    
-                    return {
-                        'market_id': market_id,
-                        'yes_price': yes_price,
-                        'no_price': no_price,
-                        'last_updated': time.time()
-                    }
+            if status == 200:
+                return _poly_quote(market_id, market)
             else:
-                logger.warning(f"Polymarket API error for {market_id}: {response.status_code}")
+                logger.warning(f"Polymarket API error for {market_id}: {status}")
                 return None
                 
         except Exception as e:
             logger.error(f"Error fetching Polymarket price for {market_id}: {e}")
             return None
     
+    def fetch_kalshi_market_prices(self, market_ids: List[str]) -> Dict[str, Dict]:
+        """Fetch current prices for several Kalshi markets with one tickers-filtered request
+        
+        Falls back to one request per market if the batch request fails, and
+        for any markets the batch response leaves out.
+        """
+        try:
+            self._kalshi_limiter.acquire()
+            params = {'tickers': ','.join(market_ids), 'limit': len(market_ids)}
+            status, data = self._get_json(KALSHI_MARKETS_URL, params)
+            
+            if status != 200:
+                logger.warning(f"Kalshi batch API error: {status}")
+                return self._fetch_each(self.fetch_kalshi_market_price, market_ids)
+            markets = data.get('markets', [])
+        except Exception as e:
+            logger.error(f"Error fetching Kalshi price batch: {e}")
+            return self._fetch_each(self.fetch_kalshi_market_price, market_ids)
+        
+        wanted = set(market_ids)
+        prices = {}
+        returned = set()
+        for market in markets:
+            market_id = market.get('ticker')
+            if market_id not in wanted:
+                continue
+            returned.add(market_id)
+            try:
+                prices[market_id] = _kalshi_quote(market_id, market)
+            except Exception as e:
+                logger.error(f"Error parsing Kalshi price for {market_id}: {e}")
+        
+        # Markets the batch left out (closed, filtered, capped) are fetched one by one
+        missing = [market_id for market_id in market_ids if market_id not in returned]
+        if missing:
+            logger.info(f"Kalshi batch omitted {len(missing)}/{len(market_ids)} markets; fetching them individually")
+            prices.update(self._fetch_each(self.fetch_kalshi_market_price, missing))
+        return prices
+    
+    def fetch_polymarket_prices(self, market_ids: List[str]) -> Dict[str, Dict]:
+        """Fetch current prices for several Polymarket markets with one id-filtered Gamma request
+        
+        Falls back to one request per market if the batch request fails, and
+        for any markets the batch response leaves out.
+        """
+        try:
+            self._poly_limiter.acquire()
+            params = [('id', market_id) for market_id in market_ids]
+            params.append(('limit', len(market_ids)))
+            status, markets = self._get_json(POLY_MARKETS_URL, params)
+            
+            if status != 200:
+                logger.warning(f"Polymarket batch API error: {status}")
+                return self._fetch_each(self.fetch_polymarket_price, market_ids)
+        except Exception as e:
+            logger.error(f"Error fetching Polymarket price batch: {e}")
+            return self._fetch_each(self.fetch_polymarket_price, market_ids)
+        
+        # Gamma returns ids as strings; key results by the id the match file used
+        wanted = {str(market_id): market_id for market_id in market_ids}
+        prices = {}
+        returned = set()
+        for market in markets:
+            market_id = wanted.get(str(market.get('id')))
+            if market_id is None:
+                continue
+            returned.add(market_id)
+            try:
+                quote = _poly_quote(market_id, market)
+            except Exception as e:
+                logger.error(f"Error parsing Polymarket price for {market_id}: {e}")
+                continue
+            if quote:
+                prices[market_id] = quote
+        
+        # Markets the batch left out (closed, filtered, capped) are fetched one by one
+        missing = [market_id for market_id in market_ids if market_id not in returned]
+        if missing:
+            logger.info(f"Polymarket batch omitted {len(missing)}/{len(market_ids)} markets; fetching them individually")
+            prices.update(self._fetch_each(self.fetch_polymarket_price, missing))
+        return prices
+    
+    @staticmethod
+    def _fetch_each(fetch_one, market_ids: List[str]) -> Dict[str, Dict]:
+        """Per-market fallback for a failed or incomplete batch request"""
+        prices = {}
+        for market_id in market_ids:
+            price_data = fetch_one(market_id)
+            if price_data:
+                prices[market_id] = price_data
+        return prices
+    
     def fetch_live_prices(self, matches: List[Dict]) -> Dict[str, Dict]:
         """Fetch live prices for all matched markets"""
         logger.info(f"Fetching live prices for {len(matches)} market pairs...")
@@ -97,42 +284,48 @@ class LivePriceFetcher:
             'timestamp': time.time()
         }
         
-        # Extract unique market IDs
-        kalshi_ids = set()
-        poly_ids = set()
-        
-        for match in matches:
-            kalshi_id = match.get('kalshi_id')
-            poly_id = match.get('poly_id')
-            
-            if kalshi_id:
-                kalshi_ids.add(kalshi_id)
-            if poly_id:
-                poly_ids.add(poly_id)
+        # Extract unique market IDs, keeping first-seen order
+        kalshi_ids = list(dict.fromkeys(m['kalshi_id'] for m in matches if m.get('kalshi_id')))
+        poly_ids = list(dict.fromkeys(m['poly_id'] for m in matches if m.get('poly_id')))
         
         logger.info(f"Fetching prices for {len(kalshi_ids)} Kalshi + {len(poly_ids)} Polymarket markets")
+        self._etag_seen = set()
         
-        # Fetch Kalshi prices
-        for i, kalshi_id in enumerate(kalshi_ids):
-            if i % 10 == 0:
-                logger.info(f"  Kalshi progress: {i}/{len(kalshi_ids)}")
+        # Markets are requested batch_size at a time; batches are latency-bound, so
+        # overlap them across both APIs while the rate limiters bound total QPS
+        total = len(kalshi_ids) + len(poly_ids)
+        size = self.batch_size
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for start in range(0, len(kalshi_ids), size):
+                chunk = kalshi_ids[start:start + size]
+                futures[executor.submit(self.fetch_kalshi_market_prices, chunk)] = ('kalshi', len(chunk))
+            for start in range(0, len(poly_ids), size):
+                chunk = poly_ids[start:start + size]
+                futures[executor.submit(self.fetch_polymarket_prices, chunk)] = ('polymarket', len(chunk))
             
-            price_data = self.fetch_kalshi_market_price(kalshi_id)
-            if price_data:
-                live_prices['kalshi'][kalshi_id] = price_data
+            # Progress is logged from a side thread every few seconds instead of per result
+            done = 0
+            stop = threading.Event()
             
-            time.sleep(0.1)  # Rate limiting
-        
-        # Fetch Polymarket prices
-        for i, poly_id in enumerate(poly_ids):
-            if i % 10 == 0:
-                logger.info(f"  Polymarket progress: {i}/{len(poly_ids)}")
-            
-            price_data = self.fetch_polymarket_price(poly_id)
-            if price_data:
-                live_prices['polymarket'][poly_id] = price_data
+            def report_progress():
+                while not stop.wait(self.progress_interval):
+                    logger.info(f"  Progress: {done}/{total}")
             
-            time.sleep(0.1)  # Rate limiting
+            reporter = threading.Thread(target=report_progress, daemon=True)
+            reporter.start()
+            try:
+                for future in as_completed(futures):
+                    platform, count = futures[future]
+                    live_prices[platform].update(future.result())
+                    done += count
+            finally:
+                stop.set()
+                reporter.join()
+        
+        # Forget cached bodies for requests this poll no longer makes
+        for key in self._etag_cache.keys() - self._etag_seen:
+            del self._etag_cache[key]
         
         logger.info(f"✅ Fetched {len(live_prices['kalshi'])} Kalshi + {len(live_prices['polymarket'])} Polymarket prices")
         
@@ -141,39 +334,49 @@ class LivePriceFetcher:
     def save_live_prices(self, live_prices: Dict, filename: str = "live_prices.json"):
         """Save live prices to JSON file"""
         try:
-            with open(filename, 'w') as f:
-                json.dump(live_prices, f, indent=2)
+            fast_json.dump(live_prices, filename)
             logger.info(f"💾 Saved live prices to {filename}")
         except Exception as e:
             logger.error(f"Error saving live prices: {e}")
 
 
-def main():
-    """Standalone price fetcher for testing"""
-    import argparse
-    
-    parser = argparse.ArgumentParser(description='Fetch live prices for matched markets')
-    parser.add_argument('--matches', default='strict_matches.json', help='Path to matches file')
-    parser.add_argument('--output', default='live_prices.json', help='Output file for live prices')
-    
-    args = parser.parse_args()
+def fetch_live(matches_file: str, output_file: str,
+               fetcher: Optional[LivePriceFetcher] = None) -> Optional[Dict]:
+    """Fetch live prices for the matches in matches_file and save them; None if matches can't be loaded
     
+    Pass the same fetcher on every poll to reuse its connections and ETag cache.
+    """
     # Load matches
     try:
-        with open(args.matches) as f:
-            data = json.load(f)
+        data = fast_json.load(matches_file)
         matches = data.get('matches', [])
         print(f"Loaded {len(matches)} market matches")
     except Exception as e:
         print(f"Error loading matches: {e}")
-        return
+        return None
     
     # Fetch live prices
-    fetcher = LivePriceFetcher()
+    fetcher = fetcher or LivePriceFetcher()
     live_prices = fetcher.fetch_live_prices(matches)
     
     # Save results
-    fetcher.save_live_prices(live_prices, args.output)
+    fetcher.save_live_prices(live_prices, output_file)
+    return live_prices
+
+
+def main():
+    """Standalone price fetcher for testing"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Fetch live prices for matched markets')
+    parser.add_argument('--matches', default='strict_matches.json', help='Path to matches file')
+    parser.add_argument('--output', default='live_prices.json', help='Output file for live prices')
+    
+    args = parser.parse_args()
+    
+    live_prices = fetch_live(args.matches, args.output)
+    if live_prices is None:
+        return
     
     print(f"✅ Live price fetch complete!")
     print(f"📊 Kalshi markets: {len(live_prices['kalshi'])}")
@@ -4,115 +4,476 @@ Strict Market Matcher
 Ultra-high quality matching with very strict filters to eliminate false positives
 """
 
+import argparse
+import hashlib
 import json
+import multiprocessing
+import os
 import re
+import sqlite3
 import datetime as dt
-from typing import Dict, List, Tuple, Optional, Set
+from typing import Dict, Iterator, List, NamedTuple, Tuple, Optional, Set, Union
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+except ImportError:
+    linear_sum_assignment = None
+
+import columnar
+import fast_json
+
+# Text feature lists at least this long are computed in worker processes, in chunks
+_PARALLEL_MIN_RECORDS = 5000
+_PARALLEL_CHUNK_SIZE = 512
+
+# Bump when text feature extraction changes, so cached features are recomputed
+_FEATURE_CACHE_VERSION = 2
+
+# Kalshi rows scored per cdist call; bounds the score matrix to rows x candidates
+_MATCH_BLOCK_ROWS = 256
+
+# Kalshi snapshot columns the matcher reads (Parquet snapshots load only these)
+_KALSHI_COLUMNS = ['title', 'description', 'endDate', 'close_time', 'conditionId', 'bestBid', 'bestAsk']
 
 try:
     from rapidfuzz import fuzz, process, utils as rf_utils
 except ImportError:
     raise SystemExit("Install rapidfuzz: pip install rapidfuzz")
 
+# Entities found by strict word boundary matching. A text is split into words once; most
+# entities are then a single word lookup, and the few phrase / lookahead patterns are only
+# searched when their trigger word is present.
+_WORD_RE = re.compile(r'\w+')
 
-def load_and_preprocess(kalshi_path: str, poly_path: str) -> Tuple[List[Dict], List[Dict]]:
-    """Load and preprocess both market datasets"""
-    print("Loading market data...")
-    
-    with open(kalshi_path) as f:
-        kalshi_raw = json.load(f)
-    with open(poly_path) as f:
-        poly_raw = json.load(f)
+# Word -> entity, for patterns that match exactly when the word appears
+# (an optional first name, as in r'\b(donald\s+)?trump\b', never changes the outcome)
+_ENTITY_WORDS = {
+    # People
+    'trump': 'trump', 'biden': 'biden', 'harris': 'harris', 'musk': 'musk',
+    'putin': 'putin', 'netanyahu': 'netanyahu',
+    # Crypto
+    'bitcoin': 'bitcoin', 'btc': 'btc', 'ethereum': 'ethereum', 'solana': 'solana',
+    'dogecoin': 'dogecoin', 'doge': 'doge',
+    # Organizations
+    'openai': 'openai', 'tesla': 'tesla', 'microsoft': 'microsoft', 'google': 'google',
+    'netflix': 'netflix',
+    # Countries/Places
+    'usa': 'usa', 'america': 'usa', 'china': 'china', 'russia': 'russia', 'ukraine': 'ukraine',
+    'israel': 'israel', 'iran': 'iran', 'germany': 'germany', 'france': 'france',
+    'netherlands': 'netherlands', 'norway': 'norway',
+    # Events/Concepts
+    'election': 'election', 'recession': 'recession', 'inflation': 'inflation',
+    'unemployment': 'unemployment',
+}
+
+# (entity, trigger word, pattern) for phrases and words with exclusions
+_ENTITY_PHRASES = [
+    ('xi jinping', 'jinping', re.compile(r'\bxi\s+jinping\b')),
+    ('taylor swift', 'swift', re.compile(r'\btaylor\s+swift\b')),
+    ('eth', 'eth', re.compile(r'\beth\b(?!\s*(flipped|flip))')),  # Avoid "eth flipped"
+    ('sol', 'sol', re.compile(r'\bsol\b(?!\s*\w)')),  # SOL as standalone word only
+    ('federal reserve', 'reserve', re.compile(r'\bfederal\s+reserve\b')),
+    ('fed', 'fed', re.compile(r'\bfed\b(?!\s*(cup|ex))')),  # Fed but not FedEx or Fed Cup
+    ('apple', 'apple', re.compile(r'\bapple\b(?!\s*(music|tv))')),
+    ('meta', 'meta', re.compile(r'\bmeta\b(?!\s*\w)')),  # Meta as standalone
+    ('usa', 'states', re.compile(r'\bunited\s+states\b')),
+    ('interest rate', 'rate', re.compile(r'\binterest\s+rate\b')),
+]
+
+# Each entity gets one bit, so a market's entities are a single int and overlap
+# checks are bitwise and/or plus bit_count
+_ENTITY_NAMES = sorted(set(_ENTITY_WORDS.values()) | {entity for entity, _, _ in _ENTITY_PHRASES})
+_ENTITY_BITS = {name: 1 << i for i, name in enumerate(_ENTITY_NAMES)}
+
+
+def _entity_mask(entities: Set[str]) -> int:
+    """Bitmask of the given entity names (names outside the table are ignored)"""
+    bits = 0
+    for entity in entities:
+        bits |= _ENTITY_BITS.get(entity, 0)
+    return bits
+
+
+def _entity_names(bits: int) -> List[str]:
+    """Sorted entity names set in a bitmask
     
-    print(f"Raw: {len(kalshi_raw)} Kalshi, {len(poly_raw)} Polymarket")
+    Bits are assigned in name order, so walking them low to high needs no sort.
+    """
+    return [_ENTITY_NAMES[i] for i in range(bits.bit_length()) if (bits >> i) & 1]
+
+
+# Entities a pair must share in domains with strict checks
+_POLITICAL_MASK = _entity_mask({'trump', 'biden', 'harris', 'election', 'president'})
+_CRYPTO_MASK = _entity_mask({'bitcoin', 'btc', 'ethereum', 'eth', 'solana', 'sol', 'dogecoin', 'doge'})
+_MACRO_MASK = _entity_mask({'federal reserve', 'fed', 'interest rate', 'unemployment', 'inflation'})
+_DOMAIN_ENTITY_MASKS = {'politics': _POLITICAL_MASK, 'crypto': _CRYPTO_MASK, 'macro': _MACRO_MASK}
+
+# Numbers with context
+_DIGIT_RE = re.compile(r'\d')
+_YEAR_RE = re.compile(r'\b(202[0-9])\b')
+_PERCENT_RE = re.compile(r'\b(\d+(?:\.\d+)?)\s*%')
+_DOLLAR_RE = re.compile(r'\$(\d+(?:,\d+)*(?:\.\d+)?)\s*([kmb]?)')
+_BPS_WORD_RE = re.compile(r'\b(\d+)\s*bps?\b')
+_PRICE_RE = re.compile(r'\b(\d+(?:,\d+)*(?:\.\d+)?)\b')
+
+# Basis-point amounts compared by the semantic check (no trailing word boundary)
+_BPS_RE = re.compile(r'(\d+)\s*bps?')
+
+# Opposite meanings for the semantic check. Word i of the flattened list is bit i, so the
+# first word of each pair is an even bit and its opposite the next odd bit.
+_OPPOSITE_PAIRS = [
+    ('above', 'below'),
+    ('over', 'under'),
+    ('more than', 'less than'),
+    ('increase', 'decrease'),
+    ('rise', 'fall'),
+    ('up', 'down'),
+    ('win', 'lose'),
+    ('outperform', 'underperform'),
+    ('cut', 'hike'),
+    ('emergency', 'scheduled')
+]
+_OPPOSITE_WORDS = [word for pair in _OPPOSITE_PAIRS for word in pair]
+_FIRST_WORD_BITS = sum(1 << i for i in range(0, len(_OPPOSITE_WORDS), 2))
+
+# Domain keywords in priority order; the first domain with a keyword in the text wins
+_DOMAIN_KEYWORDS = [
+    # Politics - must have political keywords
+    ('politics', 'election|president|presidential|trump|biden|harris|mayor|governor|senate|congress|vote|political|party|democrat|republican|prime minister'),
+    # Macro - monetary policy specific
+    ('macro', 'federal reserve|fomc|fed|interest rate|inflation|unemployment|gdp|recession|monetary policy|basis points|bps'),
+    # Crypto - digital assets
+    ('crypto', 'bitcoin|btc|ethereum|eth|crypto|blockchain|solana|sol|dogecoin|doge|defi|nft'),
+    # Finance - markets and stocks
+    ('finance', 's&p|spx|nasdaq|dow|stock market|index|tesla|apple|microsoft|amazon|earnings|revenue|market cap'),
+    # Tech - technology
+    ('tech', 'openai|gpt|ai|artificial intelligence|iphone|android|app|software|tech|google|apple|microsoft'),
+    # Sports
+    ('sports', 'nfl|nba|mlb|nhl|soccer|football|basketball|baseball|hockey|championship|super bowl|world cup|olympics'),
+    # Entertainment
+    ('entertainment', 'taylor swift|album|billboard|rotten tomatoes|movie|oscar|grammy|netflix|box office|streaming'),
+]
+
+# Domain name <-> small integer id, for the MarketTable domain column
+_DOMAIN_NAMES = [domain for domain, _ in _DOMAIN_KEYWORDS] + ['other']
+_DOMAIN_IDS = {domain: i for i, domain in enumerate(_DOMAIN_NAMES)}
+
+# Keywords are matched against a text's word set in one pass: single words map to the
+# rank of the first domain listing them, and multi-word keywords (and 's&p') are only
+# searched for when all of their words are present
+_DOMAIN_WORDS = {}
+_DOMAIN_PHRASES = []
+for _rank, (_domain, _keywords) in enumerate(_DOMAIN_KEYWORDS):
+    for _keyword in _keywords.split('|'):
+        _words = _WORD_RE.findall(_keyword)
+        if _words == [_keyword]:
+            _DOMAIN_WORDS.setdefault(_keyword, _rank)
+        else:
+            _DOMAIN_PHRASES.append((_rank, frozenset(_words), re.compile(r'\b' + re.escape(_keyword) + r'\b')))
+
+
+def _end_timestamp(end_dt: Optional[dt.datetime]) -> float:
+    """End time as epoch seconds, NaN when unknown (naive times are taken as UTC)"""
+    if not end_dt:
+        return np.nan
+    if end_dt.tzinfo is None:
+        end_dt = end_dt.replace(tzinfo=dt.timezone.utc)
+    return end_dt.timestamp()
+
+
+def _token_set_text(text_norm: str) -> str:
+    """Normalized text as its sorted unique tokens
     
-    # Process Kalshi markets
-    kalshi = []
-    for i, m in enumerate(kalshi_raw):
-        title = m.get('title', '').strip()
-        desc = m.get('description', '').strip()
-        if not title:
-            continue
-            
-        # Combine title and description
-        text = f"{title}. {desc}".strip()
-        
-        # Parse end date
-        end_dt = None
-        end_date = m.get('endDate') or m.get('close_time')
-        if end_date:
-            try:
-                end_dt = dt.datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            except:
-                pass
-        
-        # Extract key entities and numbers with strict rules
-        entities = extract_entities_strict(text)
-        numbers = extract_numbers_strict(text)
-        
-        # Classify domain
-        domain = classify_domain_strict(text)
+    token_set_ratio gives the same score on this form, but no longer has to
+    re-sort and dedupe the words on every comparison.
+    """
+    return ' '.join(sorted(set(text_norm.split())))
+
+
+def _process_kalshi_record(item: Tuple[int, Dict]) -> Optional[Dict]:
+    """Fields of one raw Kalshi market, before text features (None when it has no title)"""
+    i, m = item
+    title = m.get('title', '').strip()
+    desc = m.get('description', '').strip()
+    if not title:
+        return None
         
-        kalshi.append({
-            'idx': i,
-            'id': m.get('conditionId', ''),
-            'title': title,
-            'text': text,
-            'text_norm': rf_utils.default_process(text),
-            'end_dt': end_dt,
-            'numbers': numbers,
-            'entities': entities,
-            'domain': domain,
-            'prices': {
-                'bid': m.get('bestBid'),
-                'ask': m.get('bestAsk')
-            }
-        })
-    
-    # Process Polymarket markets
-    poly = []
-    for i, m in enumerate(poly_raw):
-        question = m.get('question', '').strip()
-        desc = m.get('description', '').strip()
-        if not question:
-            continue
-            
-        text = f"{question}. {desc}".strip()
+    # Combine title and description
+    text = f"{title}. {desc}".strip()
+    
+    # Parse end date
+    end_dt = None
+    end_date = m.get('endDate') or m.get('close_time')
+    if end_date:
+        try:
+            end_dt = dt.datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+        except:
+            pass
+    
+    return {
+        'idx': i,
+        'id': m.get('conditionId', ''),
+        'title': title,
+        'text': text,
+        'end_dt': end_dt,
+        'end_ts': _end_timestamp(end_dt),
+        'prices': {
+            'bid': m.get('bestBid'),
+            'ask': m.get('bestAsk')
+        }
+    }
+
+
+def _process_poly_record(item: Tuple[int, Dict]) -> Optional[Dict]:
+    """Fields of one raw Polymarket market, before text features (None when it has no question)"""
+    i, m = item
+    question = m.get('question', '').strip()
+    desc = m.get('description', '').strip()
+    if not question:
+        return None
         
-        # Parse end date
-        end_dt = None
-        end_date = m.get('endDate')
-        if end_date:
-            try:
-                end_dt = dt.datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            except:
-                pass
+    text = f"{question}. {desc}".strip()
+    
+    # Parse end date
+    end_dt = None
+    end_date = m.get('endDate')
+    if end_date:
+        try:
+            end_dt = dt.datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+        except:
+            pass
+    
+    # Parse outcomes
+    outcomes = m.get('outcomes', [])
+    if isinstance(outcomes, str):
+        try:
+            outcomes = fast_json.loads(outcomes)
+        except:
+            outcomes = []
+    
+    return {
+        'idx': i,
+        'id': m.get('id', ''),
+        'title': question,
+        'text': text,
+        'end_dt': end_dt,
+        'end_ts': _end_timestamp(end_dt),
+        'outcomes': outcomes
+    }
+
+
+def _text_features(text: str) -> Dict:
+    """Everything the matcher derives from a market's text alone"""
+    # Extract key entities and numbers with strict rules
+    entities = extract_entities_strict(text)
+    numbers = extract_numbers_strict(text)
+    text_norm = rf_utils.default_process(text)
+    
+    return {
+        'semantic_signals': _semantic_signals(text),
+        'text_norm': text_norm,
+        'text_tokens': _token_set_text(text_norm),
+        'numbers': numbers,
+        'rate_values': _rate_values(numbers),
+        'entity_bits': _entity_mask(entities),
+        'domain': classify_domain_strict(text)
+    }
+
+
+class _FeatureCache:
+    """On-disk text -> _text_features table (SQLite, JSON rows), reused across runs
+    
+    Keys hash the text together with _FEATURE_CACHE_VERSION, so bumping the
+    version when extraction rules change retires every old entry.
+    """
+    
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS features (key BLOB PRIMARY KEY, value BLOB NOT NULL)')
+    
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(f"{_FEATURE_CACHE_VERSION}\0{text}".encode('utf-8'), digest_size=16).digest()
+    
+    @staticmethod
+    def _encode(features: Dict) -> bytes:
+        """Features as a JSON row (stdlib json: bps values can exceed orjson's 64-bit ints)"""
+        opposite_bits, bps_amounts = features['semantic_signals']
+        return json.dumps([
+            opposite_bits, sorted(bps_amounts), features['text_norm'], features['text_tokens'],
+            sorted(features['numbers']), sorted(features['rate_values']), features['entity_bits'],
+            features['domain']
+        ]).encode('utf-8')
+    
+    @staticmethod
+    def _decode(value: bytes) -> Dict:
+        (opposite_bits, bps_amounts, text_norm, text_tokens,
+         numbers, rate_values, entity_bits, domain) = json.loads(value)
+        return {
+            'semantic_signals': (opposite_bits, frozenset(bps_amounts)),
+            'text_norm': text_norm,
+            'text_tokens': text_tokens,
+            'numbers': set(numbers),
+            'rate_values': frozenset(rate_values),
+            'entity_bits': entity_bits,
+            'domain': domain
+        }
+    
+    def get_many(self, texts: List[str]) -> Dict[str, Dict]:
+        """Cached features for whichever of texts are present and readable
         
-        # Parse outcomes
-        outcomes = m.get('outcomes', [])
-        if isinstance(outcomes, str):
+        Unreadable rows are left out, so their features are recomputed and
+        the rows overwritten.
+        """
+        found = {}
+        for start in range(0, len(texts), 500):
+            chunk = {self._key(t): t for t in texts[start:start + 500]}
+            rows = self.conn.execute(
+                f"SELECT key, value FROM features WHERE key IN ({','.join('?' * len(chunk))})",
+                list(chunk)
+            )
+            for key, value in rows:
+                try:
+                    found[chunk[key]] = self._decode(value)
+                except Exception:
+                    pass
+        return found
+    
+    def put_many(self, features: Dict[str, Dict]):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO features (key, value) VALUES (?, ?)',
+                ((self._key(t), self._encode(f)) for t, f in features.items())
+            )
+    
+    def retain(self, texts: List[str]):
+        """Drop entries for every text not in texts (markets that are gone)"""
+        with self.conn:
+            self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS live (key BLOB PRIMARY KEY)')
+            self.conn.execute('DELETE FROM live')
+            self.conn.executemany('INSERT OR IGNORE INTO live (key) VALUES (?)', ((self._key(t),) for t in texts))
+            self.conn.execute('DELETE FROM features WHERE key NOT IN (SELECT key FROM live)')
+    
+    def close(self):
+        self.conn.close()
+
+
+def _compute_features(texts: List[str]) -> Dict[str, Dict]:
+    """_text_features for each text, across processes for long lists"""
+    if len(texts) < _PARALLEL_MIN_RECORDS or (os.cpu_count() or 1) < 2:
+        return {t: _text_features(t) for t in texts}
+    
+    # Spawn fresh workers rather than fork: the bot calls this from a worker
+    # thread, and a forked child can deadlock on a lock another thread held
+    with ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn')) as executor:
+        return dict(zip(texts, executor.map(_text_features, texts, chunksize=_PARALLEL_CHUNK_SIZE)))
+
+
+def _preprocess(raw: List[Dict], process_record, cache: Optional[_FeatureCache] = None) -> List[Dict]:
+    """Preprocess raw markets in order
+    
+    Text features are computed once per distinct text, taken from the cache
+    when one is given, and spread across processes for large lists.
+    """
+    records = [r for r in map(process_record, enumerate(raw)) if r is not None]
+    texts = list(dict.fromkeys(r['text'] for r in records))
+    
+    features = {}
+    if cache is not None:
+        try:
+            features = cache.get_many(texts)
+        except sqlite3.Error as e:
+            print(f"Error reading preprocessing cache: {e}")
+    
+    computed = _compute_features([t for t in texts if t not in features])
+    features.update(computed)
+    if cache is not None and computed:
+        try:
+            cache.put_many(computed)
+        except sqlite3.Error as e:
+            print(f"Error saving preprocessing cache: {e}")
+    
+    for r in records:
+        r.update(features[r['text']])
+    
+    # Texts with no words left after normalization (e.g. only punctuation) can never match
+    return [r for r in records if r['text_norm']]
+
+
+@dataclass
+class MarketTable:
+    """Preprocessed markets, with the fields find_matches filters on as parallel arrays
+    
+    Iterating, indexing and len() go to the per-market dicts, which are kept
+    for the quality checks and the match output.
+    """
+    markets: List[Dict]
+    domain_ids: np.ndarray  # int8 index into _DOMAIN_NAMES
+    entity_bits: np.ndarray  # uint64
+    end_ts: np.ndarray  # float64 epoch seconds, NaN when unknown
+    text_tokens: List[str]
+    
+    @classmethod
+    def from_markets(cls, markets: List[Dict]) -> 'MarketTable':
+        return cls(
+            markets=markets,
+            domain_ids=np.array([_DOMAIN_IDS[m['domain']] for m in markets], dtype=np.int8),
+            entity_bits=np.array([m['entity_bits'] for m in markets], dtype=np.uint64),
+            end_ts=np.array([m['end_ts'] for m in markets], dtype=np.float64),
+            text_tokens=[m['text_tokens'] for m in markets]
+        )
+    
+    def __len__(self) -> int:
+        return len(self.markets)
+    
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.markets)
+    
+    def __getitem__(self, i: int) -> Dict:
+        return self.markets[i]
+
+
+def load_and_preprocess(kalshi_path: str, poly_path: str, 
+                        cache_path: Optional[str] = None) -> Tuple[MarketTable, MarketTable]:
+    """Load and preprocess both market datasets
+    
+    With cache_path, text features are kept in a SQLite file there and only
+    computed for texts not seen on earlier runs.
+    """
+    print("Loading market data...")
+    
+    if columnar.is_parquet(kalshi_path):
+        kalshi_raw = columnar.read_records(kalshi_path, _KALSHI_COLUMNS)
+    else:
+        kalshi_raw = fast_json.load(kalshi_path)
+    poly_raw = fast_json.load(poly_path)
+    
+    print(f"Raw: {len(kalshi_raw)} Kalshi, {len(poly_raw)} Polymarket")
+    
+    cache = None
+    if cache_path:
+        try:
+            cache = _FeatureCache(cache_path)
+        except sqlite3.Error as e:
+            print(f"Error opening preprocessing cache: {e}")
+    try:
+        kalshi = MarketTable.from_markets(_preprocess(kalshi_raw, _process_kalshi_record, cache))
+        poly = MarketTable.from_markets(_preprocess(poly_raw, _process_poly_record, cache))
+        if cache is not None:
             try:
-                outcomes = json.loads(outcomes)
-            except:
-                outcomes = []
-        
-        entities = extract_entities_strict(text)
-        numbers = extract_numbers_strict(text)
-        domain = classify_domain_strict(text)
-        
-        poly.append({
-            'idx': i,
-            'id': m.get('id', ''),
-            'title': question,
-            'text': text,
-            'text_norm': rf_utils.default_process(text),
-            'end_dt': end_dt,
-            'numbers': numbers,
-            'entities': entities,
-            'domain': domain,
-            'outcomes': outcomes
-        })
+                cache.retain([m['text'] for m in kalshi] + [m['text'] for m in poly])
+            except sqlite3.Error as e:
+                print(f"Error pruning preprocessing cache: {e}")
+    finally:
+        if cache is not None:
+            cache.close()
     
     print(f"Processed: {len(kalshi)} Kalshi, {len(poly)} Polymarket")
     return kalshi, poly
@@ -120,91 +481,12 @@ def load_and_preprocess(kalshi_path: str, poly_path: str) -> Tuple[List[Dict], L
 
 def extract_entities_strict(text: str) -> Set[str]:
     """Extract key entities with strict word boundary matching"""
-    entities = set()
     text_lower = text.lower()
+    words = set(_WORD_RE.findall(text_lower))
     
-    # Use word boundaries to avoid partial matches
-    def has_entity(pattern: str) -> bool:
-        return bool(re.search(rf'\b{re.escape(pattern)}\b', text_lower))
-    
-    # People (exact matches only)
-    people_patterns = [
-        ('trump', r'\b(donald\s+)?trump\b'),
-        ('biden', r'\b(joe\s+)?biden\b'),
-        ('harris', r'\b(kamala\s+)?harris\b'),
-        ('musk', r'\b(elon\s+)?musk\b'),
-        ('putin', r'\b(vladimir\s+)?putin\b'),
-        ('xi jinping', r'\bxi\s+jinping\b'),
-        ('taylor swift', r'\btaylor\s+swift\b'),
-        ('netanyahu', r'\bnetanyahu\b')
-    ]
-    
-    for entity, pattern in people_patterns:
-        if re.search(pattern, text_lower):
-            entities.add(entity)
-    
-    # Crypto (strict word boundaries)
-    crypto_patterns = [
-        ('bitcoin', r'\bbitcoin\b'),
-        ('btc', r'\bbtc\b'),
-        ('ethereum', r'\bethereum\b'),
-        ('eth', r'\beth\b(?!\s*(flipped|flip))'),  # Avoid "eth flipped"
-        ('solana', r'\bsolana\b'),
-        ('sol', r'\bsol\b(?!\s*\w)'),  # SOL as standalone word only
-        ('dogecoin', r'\bdogecoin\b'),
-        ('doge', r'\bdoge\b')
-    ]
-    
-    for entity, pattern in crypto_patterns:
-        if re.search(pattern, text_lower):
-            entities.add(entity)
-    
-    # Organizations
-    org_patterns = [
-        ('federal reserve', r'\bfederal\s+reserve\b'),
-        ('fed', r'\bfed\b(?!\s*(cup|ex))'),  # Fed but not FedEx or Fed Cup
-        ('openai', r'\bopenai\b'),
-        ('tesla', r'\btesla\b'),
-        ('apple', r'\bapple\b(?!\s*(music|tv))'),
-        ('microsoft', r'\bmicrosoft\b'),
-        ('google', r'\bgoogle\b'),
-        ('meta', r'\bmeta\b(?!\s*\w)'),  # Meta as standalone
-        ('netflix', r'\bnetflix\b')
-    ]
-    
-    for entity, pattern in org_patterns:
-        if re.search(pattern, text_lower):
-            entities.add(entity)
-    
-    # Countries/Places (exact matches)
-    places = [
-        ('usa', r'\b(usa|united\s+states|america)\b'),
-        ('china', r'\bchina\b'),
-        ('russia', r'\brussia\b'),
-        ('ukraine', r'\bukraine\b'),
-        ('israel', r'\bisrael\b'),
-        ('iran', r'\biran\b'),
-        ('germany', r'\bgermany\b'),
-        ('france', r'\bfrance\b'),
-        ('netherlands', r'\bnetherlands\b'),
-        ('norway', r'\bnorway\b')
-    ]
-    
-    for entity, pattern in places:
-        if re.search(pattern, text_lower):
-            entities.add(entity)
-    
-    # Events/Concepts
-    events = [
-        ('election', r'\belection\b'),
-        ('recession', r'\brecession\b'),
-        ('inflation', r'\binflation\b'),
-        ('unemployment', r'\bunemployment\b'),
-        ('interest rate', r'\binterest\s+rate\b')
-    ]
-    
-    for entity, pattern in events:
-        if re.search(pattern, text_lower):
+    entities = {_ENTITY_WORDS[word] for word in words & _ENTITY_WORDS.keys()}
+    for entity, trigger, pattern in _ENTITY_PHRASES:
+        if trigger in words and entity not in entities and pattern.search(text_lower):
             entities.add(entity)
     
     return entities
@@ -214,26 +496,32 @@ def extract_numbers_strict(text: str) -> Set[str]:
     """Extract meaningful numbers with context"""
     numbers = set()
     
+    # Every pattern needs a digit, and most a marker character, so the
+    # cheap substring checks skip the scans that cannot match
+    if not _DIGIT_RE.search(text):
+        return numbers
+    text_lower = text.lower()
+    
     # Years
-    years = re.findall(r'\b(202[0-9])\b', text)
-    numbers.update(years)
+    if '202' in text:
+        numbers.update(_YEAR_RE.findall(text))
     
     # Percentages
-    percentages = re.findall(r'\b(\d+(?:\.\d+)?)\s*%', text)
-    numbers.update(percentages)
+    if '%' in text:
+        numbers.update(_PERCENT_RE.findall(text))
     
     # Dollar amounts
-    dollars = re.findall(r'\$(\d+(?:,\d+)*(?:\.\d+)?)\s*([kmb]?)', text.lower())
-    for amount, suffix in dollars:
-        numbers.add(f"${amount}{suffix}")
+    if '$' in text:
+        for amount, suffix in _DOLLAR_RE.findall(text_lower):
+            numbers.add(f"${amount}{suffix}")
     
     # Basis points
-    bps = re.findall(r'\b(\d+)\s*bps?\b', text.lower())
-    for bp in bps:
-        numbers.add(f"{bp}bps")
+    if 'bp' in text_lower:
+        for bp in _BPS_WORD_RE.findall(text_lower):
+            numbers.add(f"{bp}bps")
     
     # Price levels
-    prices = re.findall(r'\b(\d+(?:,\d+)*(?:\.\d+)?)\b', text)
+    prices = _PRICE_RE.findall(text)
     for price in prices:
         # Only keep significant numbers (not tiny decimals or single digits)
         try:
@@ -246,77 +534,70 @@ def extract_numbers_strict(text: str) -> Set[str]:
     return numbers
 
 
+def _rate_values(numbers: Set[str]) -> frozenset:
+    """Numeric bps / percent values of extracted numbers, for the close-match check"""
+    values = set()
+    for num in numbers:
+        try:
+            if 'bps' in num:
+                values.add(int(num.replace('bps', '')))
+            elif '%' in num:
+                values.add(float(num.replace('%', '')))
+        except:
+            pass
+    return frozenset(values)
+
+
 def classify_domain_strict(text: str) -> str:
     """Strict domain classification"""
     t = text.lower()
+    words = set(_WORD_RE.findall(t))
     
-    # Politics - must have political keywords
-    if re.search(r'\b(election|president|presidential|trump|biden|harris|mayor|governor|senate|congress|vote|political|party|democrat|republican|prime minister)\b', t):
-        return 'politics'
-    
-    # Macro - monetary policy specific
-    if re.search(r'\b(federal reserve|fomc|fed|interest rate|inflation|unemployment|gdp|recession|monetary policy|basis points|bps)\b', t):
-        return 'macro'
+    # First domain whose keywords appear wins
+    rank = min((_DOMAIN_WORDS[word] for word in words & _DOMAIN_WORDS.keys()), default=len(_DOMAIN_KEYWORDS))
+    for phrase_rank, phrase_words, pattern in _DOMAIN_PHRASES:
+        if phrase_rank < rank and phrase_words <= words and pattern.search(t):
+            rank = phrase_rank
     
-    # Crypto - digital assets
-    if re.search(r'\b(bitcoin|btc|ethereum|eth|crypto|blockchain|solana|sol|dogecoin|doge|defi|nft)\b', t):
-        return 'crypto'
-    
-    # Finance - markets and stocks
-    if re.search(r'\b(s&p|spx|nasdaq|dow|stock market|index|tesla|apple|microsoft|amazon|earnings|revenue|market cap)\b', t):
-        return 'finance'
-    
-    # Tech - technology
-    if re.search(r'\b(openai|gpt|ai|artificial intelligence|iphone|android|app|software|tech|google|apple|microsoft)\b', t):
-        return 'tech'
-    
-    # Sports
-    if re.search(r'\b(nfl|nba|mlb|nhl|soccer|football|basketball|baseball|hockey|championship|super bowl|world cup|olympics)\b', t):
-        return 'sports'
+    return _DOMAIN_KEYWORDS[rank][0] if rank < len(_DOMAIN_KEYWORDS) else 'other'
+
+
+def _semantic_signals(text: str) -> Tuple[int, frozenset]:
+    """Opposite-word bits and basis-point amounts of a text, for the semantic check"""
+    text_lower = text.lower()
     
-    # Entertainment
-    if re.search(r'\b(taylor swift|album|billboard|rotten tomatoes|movie|oscar|grammy|netflix|box office|streaming)\b', t):
-        return 'entertainment'
+    # Substring tests, as before: 'up' is also found in 'support'
+    opposite_bits = 0
+    for i, word in enumerate(_OPPOSITE_WORDS):
+        if word in text_lower:
+            opposite_bits |= 1 << i
     
-    return 'other'
+    return opposite_bits, frozenset(_BPS_RE.findall(text_lower))
 
 
-def semantic_similarity_check(k_text: str, p_text: str) -> bool:
-    """Check if markets are semantically similar (not opposite)"""
-    k_lower = k_text.lower()
-    p_lower = p_text.lower()
-    
-    # Check for opposite meanings
-    opposite_pairs = [
-        ('above', 'below'),
-        ('over', 'under'),
-        ('more than', 'less than'),
-        ('increase', 'decrease'),
-        ('rise', 'fall'),
-        ('up', 'down'),
-        ('win', 'lose'),
-        ('outperform', 'underperform'),
-        ('cut', 'hike'),
-        ('emergency', 'scheduled')
-    ]
-    
-    for word1, word2 in opposite_pairs:
-        if (word1 in k_lower and word2 in p_lower) or (word2 in k_lower and word1 in p_lower):
-            return False
+def _signals_compatible(k_signals: Tuple[int, frozenset], p_signals: Tuple[int, frozenset]) -> bool:
+    """Semantic check on precomputed _semantic_signals"""
+    k_bits, k_bps = k_signals
+    p_bits, p_bps = p_signals
+    
+    # Check for opposite meanings: a first word on one side with its pair's second on the other
+    k_first = k_bits & _FIRST_WORD_BITS
+    p_first = p_bits & _FIRST_WORD_BITS
+    if (k_first << 1) & p_bits or (p_first << 1) & k_bits:
+        return False
     
     # Check for conflicting numbers (different amounts)
-    k_bps = re.findall(r'(\d+)\s*bps?', k_lower)
-    p_bps = re.findall(r'(\d+)\s*bps?', p_lower)
-    
-    if k_bps and p_bps:
-        k_amounts = set(k_bps)
-        p_amounts = set(p_bps)
-        if not (k_amounts & p_amounts):  # No overlap in amounts
-            return False
+    if k_bps and p_bps and not (k_bps & p_bps):  # No overlap in amounts
+        return False
     
     return True
 
 
+def semantic_similarity_check(k_text: str, p_text: str) -> bool:
+    """Check if markets are semantically similar (not opposite)"""
+    return _signals_compatible(_semantic_signals(k_text), _semantic_signals(p_text))
+
+
 def is_high_quality_match(k: Dict, p: Dict, score: float) -> bool:
     """Ultra-strict quality check"""
     
@@ -325,75 +606,44 @@ def is_high_quality_match(k: Dict, p: Dict, score: float) -> bool:
         return False
     
     # Must have substantial entity overlap
-    entity_intersection = k['entities'] & p['entities']
-    if not entity_intersection:
+    shared_bits = k['entity_bits'] & p['entity_bits']
+    if not shared_bits:
         return False
     
     # Entity overlap must be significant
-    entity_union = k['entities'] | p['entities']
-    entity_overlap_ratio = len(entity_intersection) / len(entity_union) if entity_union else 0
+    entity_overlap_ratio = shared_bits.bit_count() / (k['entity_bits'] | p['entity_bits']).bit_count()
     if entity_overlap_ratio < 0.3:
         return False
     
     # Semantic similarity check
-    if not semantic_similarity_check(k['text'], p['text']):
+    if not _signals_compatible(k['semantic_signals'], p['semantic_signals']):
         return False
     
     # Domain-specific strict checks
     if k['domain'] == 'politics':
         # Must share specific political entities
-        political_entities = {'trump', 'biden', 'harris', 'election', 'president'}
-        if not (k['entities'] & p['entities'] & political_entities):
+        if not (shared_bits & _POLITICAL_MASK):
             return False
     
     elif k['domain'] == 'crypto':
         # Must share same cryptocurrency
-        crypto_entities = {'bitcoin', 'btc', 'ethereum', 'eth', 'solana', 'sol', 'dogecoin', 'doge'}
-        shared_crypto = k['entities'] & p['entities'] & crypto_entities
-        if not shared_crypto:
+        if not (shared_bits & _CRYPTO_MASK):
             return False
     
     elif k['domain'] == 'macro':
         # Must share Fed/economic entities
-        macro_entities = {'federal reserve', 'fed', 'interest rate', 'unemployment', 'inflation'}
-        if not (k['entities'] & p['entities'] & macro_entities):
+        if not (shared_bits & _MACRO_MASK):
             return False
     
     # If both have numbers, they should be related
     if k['numbers'] and p['numbers']:
         # For rate/percentage markets, numbers should overlap or be close
         if not (k['numbers'] & p['numbers']):
-            # Check if they're close (within reasonable range)
-            k_vals = set()
-            p_vals = set()
-            
-            for num in k['numbers']:
-                try:
-                    if 'bps' in num:
-                        k_vals.add(int(num.replace('bps', '')))
-                    elif '%' in num:
-                        k_vals.add(float(num.replace('%', '')))
-                except:
-                    pass
-            
-            for num in p['numbers']:
-                try:
-                    if 'bps' in num:
-                        p_vals.add(int(num.replace('bps', '')))
-                    elif '%' in num:
-                        p_vals.add(float(num.replace('%', '')))
-                except:
-                    pass
-            
             # Check if any numbers are close (within 50 bps or 1%)
-            close_match = False
-            for k_val in k_vals:
-                for p_val in p_vals:
-                    if abs(k_val - p_val) <= max(50, k_val * 0.2):  # Within 50 or 20%
-                        close_match = True
-                        break
-                if close_match:
-                    break
+            close_match = any(
+                abs(k_val - p_val) <= max(50, k_val * 0.2)  # Within 50 or 20%
+                for k_val in k['rate_values'] for p_val in p['rate_values']
+            )
             
             if not close_match and score < 95:
                 return False
@@ -401,135 +651,303 @@ def is_high_quality_match(k: Dict, p: Dict, score: float) -> bool:
     return True
 
 
-def find_matches(kalshi: List[Dict], poly: List[Dict], 
-                threshold: int = 80, max_time_diff_hours: int = 24) -> List[Dict]:
-    """Find ultra-high-quality matching markets"""
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    """Set bits per element of a uint64 array"""
+    if hasattr(np, 'bitwise_count'):  # NumPy 2.0+
+        return np.bitwise_count(bits)
+    return np.unpackbits(bits.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def _entity_gate(k_bits: int, domain: str, p_bits: np.ndarray) -> np.ndarray:
+    """Which candidates pass the entity checks of is_high_quality_match
+    
+    Vectorized over one Kalshi entity set and an array of Polymarket ones:
+    overlap ratio of at least 0.3, and a shared domain entity where the
+    domain requires one.
+    """
+    k_bits = np.uint64(k_bits)
+    shared = p_bits & k_bits
+    with np.errstate(invalid='ignore', divide='ignore'):
+        passed = _popcount(shared) / _popcount(p_bits | k_bits) >= 0.3
+    domain_mask = _DOMAIN_ENTITY_MASKS.get(domain)
+    if domain_mask:
+        passed &= (shared & np.uint64(domain_mask)) != 0
+    return passed
+
+
+class _Candidate(NamedTuple):
+    """A Kalshi/Polymarket pair that passed matching, before deduplication"""
+    kalshi_row: int  # position in the Kalshi MarketTable
+    poly_row: int
+    kalshi_idx: int  # position in the raw market lists
+    poly_idx: int
+    score: float
+    entity_overlap: float
+    number_overlap: float
+
+
+def _quality_score(score: float, entity_overlap: float, number_overlap: float) -> float:
+    """Composite quality used to rank matches for deduplication"""
+    return score + (entity_overlap * 30) + (number_overlap * 20)
+
+
+def _find_candidates(kalshi: MarketTable, poly: MarketTable, 
+                     threshold: int, max_time_diff_hours: int) -> List[_Candidate]:
+    """Best passing Polymarket market per Kalshi market, in Kalshi order
+    
+    Kalshi markets are grouped by domain and entity set. Each group is scored
+    in blocks with one rapidfuzz.cdist call against only the same-domain
+    Polymarket markets that share its entities closely enough to pass the
+    quality filter's entity checks.
+    """
     
     print(f"Finding strict quality matches with threshold {threshold}, max time diff {max_time_diff_hours}h...")
     
-    # Group by domain only (tighter time filtering)
-    poly_by_domain = defaultdict(list)
-    for p in poly:
-        poly_by_domain[p['domain']].append(p)
+    # Inverted index from (domain, entity bit) to Polymarket positions, in Polymarket order
+    entity_index = defaultdict(list)
+    for i, (domain_id, bits) in enumerate(zip(poly.domain_ids.tolist(), poly.entity_bits.tolist())):
+        while bits:
+            bit = bits & -bits
+            entity_index[(domain_id, bit)].append(i)
+            bits ^= bit
+    
+    # Kalshi markets with the same domain and entities share one candidate list
+    kalshi_groups = defaultdict(list)
+    for i, key in enumerate(zip(kalshi.domain_ids.tolist(), kalshi.entity_bits.tolist())):
+        kalshi_groups[key].append(i)
     
-    matches = []
+    candidates = []
     processed = 0
+    max_time_diff_seconds = max_time_diff_hours * 3600
     
-    for k in kalshi:
-        processed += 1
-        if processed % 3000 == 0:
-            print(f"  Processed {processed}/{len(kalshi)} Kalshi markets...")
+    for (domain_id, k_bits), k_rows in kalshi_groups.items():
+        k_domain = _DOMAIN_NAMES[domain_id]
         
-        k_domain = k['domain']
+        # Only check same domain markets sharing entities (kept in Polymarket order)
+        positions = set()
+        bits = k_bits
+        while bits:
+            bit = bits & -bits
+            positions.update(entity_index.get((domain_id, bit), ()))
+            bits ^= bit
+        positions = np.array(sorted(positions), dtype=np.intp)
+        if len(positions):
+            positions = positions[_entity_gate(k_bits, k_domain, poly.entity_bits[positions])]
+        candidate_texts = [poly.text_tokens[i] for i in positions.tolist()]
+        candidate_ends = poly.end_ts[positions]
         
-        # Only check same domain
-        candidates = poly_by_domain.get(k_domain, [])
-        if not candidates:
-            continue
-        
-        # Pre-filter by time if both have timestamps
-        if k['end_dt']:
-            time_filtered = []
-            for p in candidates:
-                if p['end_dt']:
-                    time_diff = abs((k['end_dt'] - p['end_dt']).total_seconds()) / 3600
-                    if time_diff <= max_time_diff_hours:
-                        time_filtered.append(p)
-                else:
-                    time_filtered.append(p)  # Include unknown times
-            candidates = time_filtered
-        
-        if not candidates:
-            continue
-        
-        # Prepare texts for RapidFuzz
-        candidate_texts = [c['text_norm'] for c in candidates]
-        
-        # Find top matches
-        try:
-            results = process.extract(
-                k['text_norm'],
+        for start in range(0, len(k_rows), _MATCH_BLOCK_ROWS):
+            block = k_rows[start:start + _MATCH_BLOCK_ROWS]
+            if processed // 3000 != (processed + len(block)) // 3000:
+                print(f"  Processed {processed + len(block)}/{len(kalshi)} Kalshi markets...")
+            processed += len(block)
+            
+            if not candidate_texts:
+                continue
+            
+            # Fuzzy scores for the whole block; scores under threshold come back as 0
+            scores = process.cdist(
+                [kalshi.text_tokens[i] for i in block],
                 candidate_texts,
                 scorer=fuzz.token_set_ratio,
                 score_cutoff=threshold,
-                limit=1  # Only best match
+                dtype=np.float64,
+                workers=-1
             )
-        except:
-            continue
-        
-        # Process results with ultra-strict quality checks
-        for text, score, idx in results:
-            p = candidates[idx]
             
-            # Ultra-strict quality filter
-            if not is_high_quality_match(k, p, score):
-                continue
+            # Pre-filter by time: zero out pairs too far apart (unknown times always pass)
+            with np.errstate(invalid='ignore'):
+                too_far = np.abs(kalshi.end_ts[block][:, None] - candidate_ends[None, :]) > max_time_diff_seconds
+            scores[too_far] = 0
             
-            # Final time check
-            time_diff = None
-            if k['end_dt'] and p['end_dt']:
-                time_diff = abs((k['end_dt'] - p['end_dt']).total_seconds()) / 3600
-                if time_diff > max_time_diff_hours:
-                    continue
+            # Best match per row (first on ties)
+            best = scores.argmax(axis=1)
+            best_scores = scores[np.arange(len(block)), best]
             
-            # Calculate overlap scores
-            entity_intersection = k['entities'] & p['entities']
-            entity_union = k['entities'] | p['entities']
-            entity_score = len(entity_intersection) / len(entity_union) if entity_union else 0
-            
-            number_intersection = k['numbers'] & p['numbers']
-            number_union = k['numbers'] | p['numbers']
-            number_score = len(number_intersection) / len(number_union) if number_union else 0
-            
-            matches.append({
-                'kalshi_idx': k['idx'],
-                'poly_idx': p['idx'],
-                'kalshi_id': k['id'],
-                'poly_id': p['id'],
-                'kalshi_title': k['title'],
-                'poly_title': p['title'],
-                'score': score,
-                'domain': k_domain,
-                'time_diff_hours': round(time_diff, 1) if time_diff else None,
-                'entity_overlap': round(entity_score, 3),
-                'number_overlap': round(number_score, 3),
-                'shared_entities': sorted(list(entity_intersection)),
-                'shared_numbers': sorted(list(number_intersection))
-            })
-    
-    print(f"Found {len(matches)} strict quality candidate matches")
-    return matches
-
-
-def deduplicate_matches(matches: List[Dict]) -> List[Dict]:
-    """Remove duplicates with ultra-strict 1-1 matching"""
+            for k_row, p_pos, score in zip(block, best.tolist(), best_scores.tolist()):
+                if not score or score < threshold:
+                    continue
+                p_row = int(positions[p_pos])
+                k = kalshi[k_row]
+                p = poly[p_row]
+                
+                # Ultra-strict quality filter
+                if not is_high_quality_match(k, p, score):
+                    continue
+                
+                # Overlap scores rank the candidates for deduplication
+                shared_bits = k['entity_bits'] & p['entity_bits']
+                entity_union = (k['entity_bits'] | p['entity_bits']).bit_count()
+                entity_score = shared_bits.bit_count() / entity_union if entity_union else 0
+                
+                number_union = len(k['numbers'] | p['numbers'])
+                number_score = len(k['numbers'] & p['numbers']) / number_union if number_union else 0
+                
+                candidates.append(_Candidate(
+                    k_row, p_row, k['idx'], p['idx'], score,
+                    round(entity_score, 3), round(number_score, 3)
+                ))
+    
+    # Back to Kalshi order, as if the markets had been scanned one by one
+    candidates.sort(key=lambda c: c.kalshi_idx)
+    
+    print(f"Found {len(candidates)} strict quality candidate matches")
+    return candidates
+
+
+def _match_record(kalshi: MarketTable, poly: MarketTable, candidate: _Candidate) -> Dict:
+    """Full output dict for one match"""
+    k = kalshi[candidate.kalshi_row]
+    p = poly[candidate.poly_row]
+    
+    # Pairs too far apart never become candidates; NaN means an end date is unknown
+    time_diff = abs(k['end_ts'] - p['end_ts']) / 3600
+    if np.isnan(time_diff):
+        time_diff = None
+    
+    return {
+        'kalshi_idx': k['idx'],
+        'poly_idx': p['idx'],
+        'kalshi_id': k['id'],
+        'poly_id': p['id'],
+        'kalshi_title': k['title'],
+        'poly_title': p['title'],
+        'score': candidate.score,
+        'domain': k['domain'],
+        'time_diff_hours': round(time_diff, 1) if time_diff else None,
+        'entity_overlap': candidate.entity_overlap,
+        'number_overlap': candidate.number_overlap,
+        'shared_entities': _entity_names(k['entity_bits'] & p['entity_bits']),
+        'shared_numbers': sorted(k['numbers'] & p['numbers'])
+    }
+
+
+def find_matches(kalshi: Union[MarketTable, List[Dict]], poly: Union[MarketTable, List[Dict]], 
+                threshold: int = 80, max_time_diff_hours: int = 24) -> List[Dict]:
+    """Find ultra-high-quality matching markets"""
+    if not isinstance(kalshi, MarketTable):
+        kalshi = MarketTable.from_markets(kalshi)
+    if not isinstance(poly, MarketTable):
+        poly = MarketTable.from_markets(poly)
+    
+    candidates = _find_candidates(kalshi, poly, threshold, max_time_diff_hours)
+    return [_match_record(kalshi, poly, c) for c in candidates]
+
+
+def _best_assignment(pairs: List[Tuple[int, int]], weights: List[float]) -> List[int]:
+    """Indices of the 1-1 subset of (kalshi, poly) pairs with the largest total weight
+    
+    Pairs only compete within connected groups of markets, so each group
+    is solved on its own small dense matrix.
+    """
+    k_pos = {}
+    p_pos = {}
+    rows = [k_pos.setdefault(k_idx, len(k_pos)) for k_idx, _ in pairs]
+    cols = [p_pos.setdefault(p_idx, len(p_pos)) for _, p_idx in pairs]
+    n_k = len(k_pos)
+    
+    # Bipartite graph over Kalshi nodes 0..n_k-1 and Polymarket nodes n_k..
+    size = n_k + len(p_pos)
+    graph = coo_matrix((np.ones(len(pairs)), (rows, [n_k + c for c in cols])), shape=(size, size))
+    _, labels = connected_components(graph, directed=False)
+    
+    groups = defaultdict(list)
+    for i, row in enumerate(rows):
+        groups[labels[row]].append(i)
+    
+    chosen = []
+    for group in groups.values():
+        if len(group) == 1:
+            chosen.append(group[0])
+            continue
+        
+        g_rows = {}
+        g_cols = {}
+        for i in group:
+            g_rows.setdefault(rows[i], len(g_rows))
+            g_cols.setdefault(cols[i], len(g_cols))
+        
+        # Missing pairs weigh 0 and index -1, so picking one adds nothing
+        weight = np.zeros((len(g_rows), len(g_cols)))
+        index = np.full((len(g_rows), len(g_cols)), -1)
+        for i in group:
+            weight[g_rows[rows[i]], g_cols[cols[i]]] = weights[i]
+            index[g_rows[rows[i]], g_cols[cols[i]]] = i
+        
+        for r, c in zip(*linear_sum_assignment(weight, maximize=True)):
+            if index[r, c] >= 0:
+                chosen.append(int(index[r, c]))
+    
+    return chosen
+
+
+def _select_one_to_one(pairs: List[Tuple[int, int]], weights: List[float], optimal: bool = False) -> List[int]:
+    """Indices of the pairs kept by 1-1 deduplication, in input order
+    
+    Pairs come sorted best first and are picked greedily in that order. With
+    optimal, keeps the 1-1 subset with the best total weight instead, which
+    requires scipy.
+    """
+    if optimal and linear_sum_assignment is None:
+        raise ImportError("Install scipy for optimal assignment: pip install scipy")
+    
+    if not pairs:
+        return []
+    
+    if optimal:
+        return sorted(_best_assignment(pairs, weights))
+    
+    # Markets taken so far, as flags indexed by raw market index
+    used_kalshi = np.zeros(max(k_idx for k_idx, _ in pairs) + 1, dtype=bool)
+    used_poly = np.zeros(max(p_idx for _, p_idx in pairs) + 1, dtype=bool)
+    chosen = []
+    
+    for i, (k_idx, p_idx) in enumerate(pairs):
+        if not used_kalshi[k_idx] and not used_poly[p_idx]:
+            used_kalshi[k_idx] = True
+            used_poly[p_idx] = True
+            chosen.append(i)
+    
+    return chosen
+
+
+def _deduplicate_candidates(candidates: List[_Candidate], optimal: bool = False) -> List[_Candidate]:
+    """1-1 deduplication of matching candidates, best quality first (see _select_one_to_one)"""
+    print("Deduplicating matches...")
+    
+    ranked = sorted(candidates, key=lambda c: _quality_score(c.score, c.entity_overlap, c.number_overlap), reverse=True)
+    chosen = _select_one_to_one(
+        [(c.kalshi_idx, c.poly_idx) for c in ranked],
+        [_quality_score(c.score, c.entity_overlap, c.number_overlap) for c in ranked],
+        optimal=optimal
+    )
+    
+    print(f"Final matches after strict deduplication: {len(chosen)}")
+    return [ranked[i] for i in chosen]
+
+
+def deduplicate_matches(matches: List[Dict], optimal: bool = False) -> List[Dict]:
+    """Remove duplicates with ultra-strict 1-1 matching (see _select_one_to_one)"""
     print("Deduplicating matches...")
     
     # Sort by composite quality score
     def quality_score(m):
-        return m['score'] + (m['entity_overlap'] * 30) + (m['number_overlap'] * 20)
+        return _quality_score(m['score'], m['entity_overlap'], m['number_overlap'])
     
     matches.sort(key=quality_score, reverse=True)
-    
-    used_kalshi = set()
-    used_poly = set()
-    final_matches = []
-    
-    for match in matches:
-        k_idx = match['kalshi_idx']
-        p_idx = match['poly_idx']
-        
-        if k_idx not in used_kalshi and p_idx not in used_poly:
-            used_kalshi.add(k_idx)
-            used_poly.add(p_idx)
-            final_matches.append(match)
+    chosen = _select_one_to_one(
+        [(m['kalshi_idx'], m['poly_idx']) for m in matches],
+        [quality_score(m) for m in matches],
+        optimal=optimal
+    )
+    final_matches = [matches[i] for i in chosen]
     
     print(f"Final matches after strict deduplication: {len(final_matches)}")
     return final_matches
 
 
-def save_matches(matches: List[Dict], output_file: str):
-    """Save matches to JSON file"""
+def save_matches(matches: List[Dict], output_file: str, pretty: bool = False):
+    """Save matches to JSON file (compact unless pretty)"""
     output = {
         'generated_at': dt.datetime.now(dt.timezone.utc).isoformat(),
         'total_matches': len(matches),
@@ -544,8 +962,13 @@ def save_matches(matches: List[Dict], output_file: str):
         'matches': matches
     }
     
-    with open(output_file, 'w') as f:
-        json.dump(output, f, indent=2)
+    fast_json.dump(output, output_file, indent=pretty)
+    
+    # Counts only, so readers don't have to parse the full match list
+    fast_json.dump({
+        'generated_at': output['generated_at'],
+        'total_matches': output['total_matches']
+    }, fast_json.meta_path(output_file), indent=False)
     
     print(f"Saved {len(matches)} ultra-quality matches to {output_file}")
 
@@ -588,26 +1011,43 @@ def print_summary(matches: List[Dict]):
             print(f"   Shared: {', '.join(m['shared_entities'])}")
 
 
-def main():
-    """Main execution"""
-    kalshi_file = "kalshi_markets.json"
-    poly_file = "polymarket_current_active_gamma.json"
-    output_file = "strict_matches.json"
-    
+def run_matches(kalshi_file: str, poly_file: str, output_file: str, 
+                pretty: bool = False, cache_path: Optional[str] = None,
+                optimal_assignment: bool = False) -> Optional[List[Dict]]:
+    """Match the two market dumps and save the result; None if no markets were loaded"""
     # Load and preprocess
-    kalshi, poly = load_and_preprocess(kalshi_file, poly_file)
+    kalshi, poly = load_and_preprocess(kalshi_file, poly_file, cache_path)
     
     if len(kalshi) == 0 or len(poly) == 0:
         print("Error: No markets loaded!")
-        return
+        return None
     
-    # Find ultra-strict matches
+    # Find ultra-strict matches; only the deduplicated ones are built into output dicts
     print(f"\nFinding ultra-strict matches...")
-    matches = find_matches(kalshi, poly, threshold=80, max_time_diff_hours=24)
-    final_matches = deduplicate_matches(matches)
+    candidates = _find_candidates(kalshi, poly, threshold=80, max_time_diff_hours=24)
+    final_matches = [_match_record(kalshi, poly, c) for c in _deduplicate_candidates(candidates, optimal_assignment)]
+    
+    save_matches(final_matches, output_file, pretty=pretty)
+    return final_matches
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Strict market matcher')
+    parser.add_argument('--pretty', action='store_true', help='Indent the matches JSON for reading')
+    parser.add_argument('--cache', default=None, help='SQLite file caching text preprocessing across runs (optional)')
+    parser.add_argument('--optimal-assignment', action='store_true',
+                        help='Keep the 1-1 matches with the best total quality instead of picking greedily (requires scipy)')
+    args = parser.parse_args()
+    
+    kalshi_file = "kalshi_markets.json"
+    poly_file = "polymarket_current_active_gamma.json"
+    output_file = "strict_matches.json"
     
-    save_matches(final_matches, output_file)
-    print_summary(final_matches)
+    final_matches = run_matches(kalshi_file, poly_file, output_file, pretty=args.pretty, cache_path=args.cache,
+                                optimal_assignment=args.optimal_assignment)
+    if final_matches is not None:
+        print_summary(final_matches)
 
 
 if __name__ == "__main__":